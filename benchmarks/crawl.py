@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# End-to-end crawl benchmark against the local mock server, for every mode.
+# Reports items/s and requests/s (best of --repeat), the parse time per item
+# and the peak memory of a crawl. Results can be saved and compared with a
+# previous run, exiting with 1 if any throughput dropped beyond --tolerance.
+# Every case must crawl the whole mock (pages * tweets-per-page items), a short
+# crawl is reported and also exits with 1:
+#
+#   python benchmarks/crawl.py --save baseline.json
+#   python benchmarks/crawl.py --compare baseline.json
+
+import os
+import sys
+
+# Runs from a checkout without installing the package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_server import MockServer, LocalTransport
+from bluebird import BlueBird, MetricsCollector
+from argparse import ArgumentParser
+import tracemalloc
+import json
+import time
+
+QUERY = {'fields': [{'items': ['bluebird']}]}
+
+CASES = {
+    'search_2': lambda bluebird: bluebird.search(QUERY, deep=True, mode=BlueBird.API_2),
+    'user_timeline_2': lambda bluebird: bluebird.user_timeline('jack', deep=True,
+                                                               mode=BlueBird.API_2),
+    'search_1_1': lambda bluebird: bluebird.search(QUERY, deep=True, mode=BlueBird.API_1_1),
+    'user_timeline_1_1': lambda bluebird: bluebird.user_timeline('jack', deep=True,
+                                                                 mode=BlueBird.API_1_1),
+    'search_web': lambda bluebird: bluebird.search(QUERY, deep=True, mode=BlueBird.API_WEB),
+    'user_timeline_web': lambda bluebird: bluebird.user_timeline('jack', deep=True,
+                                                                 mode=BlueBird.API_WEB),
+    'followers': lambda bluebird: bluebird.get_followers('jack'),
+}
+
+
+def crawl(port, case, parse_workers=None):
+    transport = LocalTransport(port)
+    bluebird = BlueBird(transport=transport, parse_workers=parse_workers)
+    requests = transport.requests
+
+    items = 0
+    started = time.perf_counter()
+    for _ in CASES[case](bluebird):
+        items += 1
+    seconds = time.perf_counter() - started
+
+    bluebird.guest_tokens.close()
+    bluebird.close()
+    return items, transport.requests - requests, seconds
+
+
+def profile(port, case, parse_workers=None):
+    with MetricsCollector() as collector:
+        tracemalloc.start()
+        items, _, _ = crawl(port, case, parse_workers)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    parse_seconds = sum(values['sum']
+                        for values in collector.snapshot().get('parse_seconds', {}).values())
+    return parse_seconds / max(items, 1), peak
+
+
+def run(port, cases, repeat, expected_items, parse_workers=None):
+    results = dict()
+    for case in cases:
+        runs = [crawl(port, case, parse_workers) for _ in range(repeat)]
+        items, requests, seconds = min(runs, key=lambda run: run[2])
+        parse_time, peak = profile(port, case, parse_workers)
+        results[case] = {
+            'items': items,
+            'requests': requests,
+            'items_per_second': items / seconds,
+            'requests_per_second': requests / seconds,
+            'parse_us_per_item': parse_time * 1e6,
+            'peak_mib': peak / 2**20
+        }
+        result = results[case]
+        missing = f'  expected {expected_items} items' if items != expected_items else ''
+        print(f'{case:<18} {items:>7} {requests:>8} {result["items_per_second"]:>10.0f} '
+              f'{result["requests_per_second"]:>10.1f} {result["parse_us_per_item"]:>9.1f} '
+              f'{result["peak_mib"]:>8.1f}{missing}')
+    return results
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for case, result in results.items():
+        if case not in baseline:
+            continue
+        ratio = result['items_per_second'] / baseline[case]['items_per_second']
+        print(f'{case:<18} {ratio:6.2f}x')
+        if ratio < 1 - tolerance:
+            regressions.append(case)
+    return regressions
+
+
+def main():
+    parser = ArgumentParser(description='BlueBird crawl benchmark')
+    parser.add_argument('cases', nargs='*', default=list(CASES), help=', '.join(CASES))
+    parser.add_argument('--pages', type=int, default=20)
+    parser.add_argument('--tweets-per-page', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--parse-workers', type=int, help='pipelined HTML parsing processes')
+    parser.add_argument('--save')
+    parser.add_argument('--compare')
+    parser.add_argument('--tolerance', type=float, default=0.15)
+    args = parser.parse_args()
+    unknown = set(args.cases).difference(CASES)
+    if unknown:
+        parser.error(f'unknown cases: {", ".join(sorted(unknown))}')
+
+    with MockServer(args.pages, args.tweets_per_page) as server:
+        print(f'{"case":<18} {"items":>7} {"requests":>8} {"items/s":>10} {"requests/s":>10} '
+              f'{"parse µs":>9} {"peak MiB":>8}')
+        expected_items = args.pages * args.tweets_per_page
+        results = run(server.port, args.cases, args.repeat, expected_items, args.parse_workers)
+
+    if args.save:
+        with open(args.save, 'w') as results_file:
+            json.dump(results, results_file, indent=2)
+
+    failed = False
+    incomplete = [case for case, result in results.items() if result['items'] != expected_items]
+    if incomplete:
+        print(f'incomplete crawls: {", ".join(incomplete)}')
+        failed = True
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance)
+        if regressions:
+            print(f'regressions: {", ".join(regressions)}')
+            failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
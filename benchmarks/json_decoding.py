@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Decodes API v2 search pages with every available backend, eagerly and lazily.
+# Pages are read from the files given as arguments (recorded responses), or
+# generated with the same layout as 2/search/adaptive.json if none is given.
+
+import os
+import sys
+
+# Runs from a checkout without installing the package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bluebird.decoding import JSONDecoder
+from bluebird import BlueBird
+import random
+import json
+import timeit
+
+
+def build_tweet(tweet_id, user_id):
+    return {
+        'created_at': 'Sun Oct 18 10:00:00 +0000 2020',
+        'id_str': str(tweet_id),
+        'full_text': ' '.join(random.choice(['bluebird', 'scraper', 'python', '#test', '@user'])
+                              for _ in range(30)),
+        'display_text_range': [0, 200],
+        'entities': {
+            'hashtags': [{'text': 'test', 'indices': [10, 15]}],
+            'symbols': [],
+            'user_mentions': [{'screen_name': 'user', 'id_str': str(user_id), 'indices': [20, 25]}],
+            'urls': []
+        },
+        'source': '<a href="https://mobile.twitter.com" rel="nofollow">Twitter Web App</a>',
+        'user_id_str': str(user_id),
+        'retweet_count': random.randint(0, 1000),
+        'favorite_count': random.randint(0, 1000),
+        'reply_count': random.randint(0, 100),
+        'conversation_id_str': str(tweet_id),
+        'lang': 'en'
+    }
+
+
+def build_user(user_id):
+    return {
+        'id_str': str(user_id),
+        'name': f'User {user_id}',
+        'screen_name': f'user{user_id}',
+        'location': 'Santiago de Compostela',
+        'description': 'A very long profile description ' * 5,
+        'entities': {'description': {'urls': []}},
+        'followers_count': random.randint(0, 100000),
+        'friends_count': random.randint(0, 1000),
+        'listed_count': random.randint(0, 100),
+        'created_at': 'Sun Oct 18 10:00:00 +0000 2009',
+        'favourites_count': random.randint(0, 10000),
+        'statuses_count': random.randint(0, 100000),
+        'profile_image_url_https': 'https://pbs.twimg.com/profile_images/0/image_normal.jpg',
+        'profile_banner_url': 'https://pbs.twimg.com/profile_banners/0/0',
+        'profile_link_color': '1DA1F2',
+        'verified': False
+    }
+
+
+def build_page(tweets=100):
+    tweet_ids = [random.randint(10**18, 10**19) for _ in range(tweets)]
+    user_ids = [random.randint(10**6, 10**9) for _ in range(tweets)]
+    entries = [{
+        'entryId': f'sq-I-t-{tweet_id}',
+        'sortIndex': str(tweet_id),
+        'content': {'item': {'content': {'tweet': {'id': str(tweet_id), 'displayType': 'Tweet'}}}}
+    } for tweet_id in tweet_ids]
+    entries.append({
+        'entryId': 'sq-cursor-bottom',
+        'sortIndex': '0',
+        'content': {'operation': {'cursor': {'value': 'scroll:thGAVUV0VFVBaAwL', 'cursorType': 'Bottom'}}}
+    })
+    return json.dumps({
+        'globalObjects': {
+            'tweets': {str(tweet_id): build_tweet(tweet_id, user_id)
+                       for tweet_id, user_id in zip(tweet_ids, user_ids)},
+            'users': {str(user_id): build_user(user_id) for user_id in user_ids},
+            'moments': {},
+            'cards': {},
+            'places': {},
+            'media': {},
+            'broadcasts': {},
+            'topics': {},
+            'lists': {}
+        },
+        'timeline': {'id': 'search-0', 'instructions': [{'addEntries': {'entries': entries}}]}
+    }).encode('utf-8')
+
+
+def main():
+    if len(sys.argv) > 1:
+        pages = [open(path, 'rb').read() for path in sys.argv[1:]]
+    else:
+        pages = [build_page() for _ in range(10)]
+    size = sum(len(page) for page in pages) / len(pages)
+    print(f'{len(pages)} pages, {size / 1024:.1f} KiB/page')
+
+    for backend in JSONDecoder.BACKENDS:
+        if not JSONDecoder.is_available(backend):
+            print(f'{backend:<10} not installed')
+            continue
+
+        for lazy in (False, True):
+            if lazy and not JSONDecoder.is_available('simdjson'):
+                continue
+            decoder = JSONDecoder(backend, lazy=lazy)
+
+            for page in pages:
+                decoded = decoder.loads_page_2(page)
+                assert BlueBird._get_cursor_2(decoded) is not None
+
+            seconds = min(
+                timeit.repeat(lambda: [decoder.loads_page_2(page) for page in pages],
+                              number=10,
+                              repeat=5))
+            per_page = seconds / (10 * len(pages)) * 1e3
+            mode = 'lazy' if lazy else 'eager'
+            print(f'{backend:<10} {mode:<6} {per_page:8.3f} ms/page')
+
+
+if __name__ == '__main__':
+    main()
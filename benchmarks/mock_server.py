@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Local stand-in for the Twitter endpoints used by BlueBird. It runs in its own
+# process and serves synthetic pages generated once at startup, so the client
+# side of a benchmark is not competing with the server for the GIL.
+#
+# Requests reach it through LocalTransport, which rewrites
+# https://<host>/<path> into http://127.0.0.1:<port>/<host>/<path>.
+
+import os
+import sys
+
+# Runs from a checkout without installing the package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+from multiprocessing import get_context
+from json_decoding import build_tweet, build_user
+from text_extraction import PARAGRAPH, EMOJI
+from bluebird import Transport
+import random
+import json
+import time
+
+FIRST_TWEET_ID = 1300000000000000000
+USER_ID = 783214
+
+WEB_TWEET = '<li class="js-stream-item stream-item"><div class="tweet js-stream-tweet" ' \
+            'data-tweet-id="{tweet_id}" data-name="User {user_id}" ' \
+            'data-screen-name="user{user_id}" data-user-id="{user_id}">' \
+            '<div class="content"><small class="time"><a class="tweet-timestamp">' \
+            '<span class="_timestamp" data-time="{timestamp}" data-time-ms="{timestamp}000">' \
+            '</span></a></small>{paragraph}</div></div></li>'
+
+FOLLOWER = '<table class="user-item"><tr><td class="info fifty screenname">' \
+           '<a href="/user{user_id}" name="user{user_id}"><strong class="fullname">User {user_id}' \
+           '</strong><span class="username">@user{user_id}</span></a></td></tr></table>'
+
+
+class Pages:
+    def __init__(self, pages=20, tweets_per_page=100, seed=0):
+        random.seed(seed)
+        self.pages = pages
+        self.tweets_per_page = tweets_per_page
+
+        # Newest first, like every timeline
+        self.tweet_ids = [
+            FIRST_TWEET_ID + pages * tweets_per_page - i for i in range(pages * tweets_per_page)
+        ]
+        self.user_ids = [random.randint(10**6, 10**9) for _ in self.tweet_ids]
+        self.tweets_1_1 = [
+            self._build_tweet_1_1(tweet_id, user_id)
+            for tweet_id, user_id in zip(self.tweet_ids, self.user_ids)
+        ]
+        self.pages_2 = [self._build_page_2(page) for page in range(pages + 1)]
+        self.pages_web = [self._build_page_web(page) for page in range(pages + 1)]
+        self.pages_followers = [self._build_page_followers(page) for page in range(pages + 1)]
+        self.user = json.dumps({'id': USER_ID, 'id_str': str(USER_ID), 'screen_name': 'jack'})
+        self._pages_1_1 = dict()
+
+    def _get_slice(self, page):
+        start = page * self.tweets_per_page
+        return range(start, min(start + self.tweets_per_page, len(self.tweet_ids)))
+
+    def _build_tweet_1_1(self, tweet_id, user_id):
+        tweet = build_tweet(tweet_id, user_id)
+        tweet['id'] = tweet_id
+        tweet['user'] = build_user(user_id)
+        return tweet
+
+    def _build_page_2(self, page):
+        indexes = self._get_slice(page)
+        entries = [{
+            'entryId': f'sq-I-t-{self.tweet_ids[i]}',
+            'sortIndex': str(self.tweet_ids[i]),
+            'content': {
+                'item': {
+                    'content': {
+                        'tweet': {
+                            'id': str(self.tweet_ids[i]),
+                            'displayType': 'Tweet'
+                        }
+                    }
+                }
+            }
+        } for i in indexes]
+        # The last page has no cursor
+        if page < self.pages:
+            entries.append({
+                'entryId': 'sq-cursor-bottom',
+                'sortIndex': '0',
+                'content': {
+                    'operation': {
+                        'cursor': {
+                            'value': str(page + 1),
+                            'cursorType': 'Bottom'
+                        }
+                    }
+                }
+            })
+        return json.dumps({
+            'globalObjects': {
+                'tweets': {
+                    str(self.tweet_ids[i]): build_tweet(self.tweet_ids[i], self.user_ids[i])
+                    for i in indexes
+                },
+                'users': {str(self.user_ids[i]): build_user(self.user_ids[i])
+                          for i in indexes}
+            },
+            'timeline': {
+                'id': 'search-0',
+                'instructions': [{
+                    'addEntries': {
+                        'entries': entries
+                    }
+                }]
+            }
+        })
+
+    def _build_page_web(self, page):
+        timestamp = int(time.time())
+        emoji = EMOJI.format('1f600', '😀', 'smile')
+        items_html = ''.join(
+            WEB_TWEET.format(tweet_id=self.tweet_ids[i],
+                             user_id=self.user_ids[i],
+                             timestamp=timestamp - i,
+                             paragraph=PARAGRAPH.format(emoji, '')) for i in self._get_slice(page))
+        return json.dumps({
+            'min_position': f'p{page + 1}',
+            'has_more_items': page < self.pages - 1,
+            'items_html': f'<ol class="stream-items">{items_html}</ol>',
+            'new_latent_count': len(self._get_slice(page))
+        })
+
+    def _build_page_followers(self, page):
+        followers = ''.join(FOLLOWER.format(user_id=self.user_ids[i]) for i in self._get_slice(page))
+        more = ''
+        if page < self.pages - 1:
+            more = f'<div class="w-button-more"><a href="/jack/followers?cursor={page + 1}">' \
+                   'Show more people</a></div>'
+        return f'<html><body><div class="user-list">{followers}</div>{more}</body></html>'
+
+    def get_page_1_1(self, max_id, count, search):
+        key = (max_id, count, search)
+        page = self._pages_1_1.get(key)
+        if page is None:
+            start = 0
+            if max_id is not None:
+                # max_id is inclusive, as in the API
+                start = next((i for i, tweet_id in enumerate(self.tweet_ids) if tweet_id <= max_id),
+                             len(self.tweet_ids))
+            tweets = self.tweets_1_1[start:start + count]
+            page = self._pages_1_1[key] = json.dumps({'statuses': tweets} if search else tweets)
+        return page
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately, Nagle would delay the body
+    disable_nagle_algorithm = True
+    pages = None
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, body, content_type='application/json'):
+        body = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('content-type', content_type)
+        self.send_header('content-length', str(len(body)))
+        self.send_header('x-rate-limit-limit', '1000000')
+        self.send_header('x-rate-limit-remaining', '1000000')
+        self.send_header('x-rate-limit-reset', str(int(time.time()) + 900))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if self.path.endswith('/1.1/guest/activate.json'):
+            self._send(json.dumps({'guest_token': str(random.randint(10**18, 10**19))}))
+        else:
+            self.send_error(404)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        host, _, path = url.path.lstrip('/').partition('/')
+        pages = Handler.pages
+
+        if host == 'api.twitter.com':
+            if path == '1.1/users/show.json':
+                self._send(pages.user)
+            elif path == '2/search/adaptive.json' or path.startswith('2/timeline/profile/'):
+                self._send(pages.pages_2[int(params.get('cursor', 0))])
+            elif path in ('1.1/search/tweets.json', '1.1/statuses/user_timeline.json'):
+                max_id = int(params['max_id']) if 'max_id' in params else None
+                self._send(
+                    pages.get_page_1_1(max_id, int(params.get('count', 100)),
+                                       path.startswith('1.1/search')))
+            else:
+                self.send_error(404)
+        elif host == 'twitter.com':
+            position = params.get('max_position', '-1')
+            page = 0 if position in ('', '-1') else int(position.lstrip('p'))
+            self._send(pages.pages_web[page])
+        elif host == 'mobile.twitter.com':
+            self._send(pages.pages_followers[int(params.get('cursor', 0))], 'text/html')
+        else:
+            self.send_error(404)
+
+
+def _serve(queue, pages, tweets_per_page):
+    Handler.pages = Pages(pages, tweets_per_page)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+class MockServer:
+    def __init__(self, pages=20, tweets_per_page=100):
+        self.pages = pages
+        self.tweets_per_page = tweets_per_page
+        self.port = None
+        self._process = None
+
+    def __enter__(self):
+        context = get_context('fork')
+        queue = context.Queue()
+        self._process = context.Process(target=_serve,
+                                        args=(queue, self.pages, self.tweets_per_page),
+                                        daemon=True)
+        self._process.start()
+        self.port = queue.get(timeout=60)
+        return self
+
+    def __exit__(self, *args):
+        self._process.terminate()
+        self._process.join()
+
+
+class LocalTransport(Transport):
+    def __init__(self, port, **kwargs):
+        super(LocalTransport, self).__init__(proxy='', **kwargs)
+        self.base_url = f'http://127.0.0.1:{port}/'
+        self.requests = 0
+
+    def request(self, method, url, headers=None, body=None):
+        self.requests += 1
+        url = self.base_url + url.split('://', 1)[1]
+        return super(LocalTransport, self).request(method, url, headers, body)
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Compares the serialize + regex + re-parse text path with the single-pass extractor
+
+import os
+import sys
+
+# Runs from a checkout without installing the package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bluebird import BlueBird
+from bluebird.text import extract_text
+from lxml.html import document_fromstring
+from lxml.etree import tostring
+import timeit
+
+EMOJI = '<img class="Emoji Emoji--forText" src="https://abs.twimg.com/emoji/v2/72x72/{}.png" ' \
+        'draggable="false" alt="{}" title="{}" aria-label="Emoji">'
+
+PARAGRAPH = '<p class="TweetTextSize js-tweet-text tweet-text" lang="en" data-aria-label-part="0">' \
+            'Testing the <a href="/hashtag/bluebird" class="twitter-hashtag">#<b>bluebird</b></a> ' \
+            'scraper {} with <a class="twitter-atreply" href="/brunn3is">@<b>brunn3is</b></a> ' \
+            'and a link <a href="https://t.co/x" class="twitter-timeline-link">' \
+            '<span class="invisible">https://</span><span class="js-display-url">github.com/brunneis</span>' \
+            '<span class="tco-ellipsis"><span class="invisible">&nbsp;</span>…</span></a> {}</p>'
+
+
+def build_items_html(tweets, emojis):
+    emoji_html = ' '.join(EMOJI.format('1f600', '😀', 'smile') for _ in range(emojis))
+    paragraphs = ''.join(PARAGRAPH.format(emoji_html, emoji_html) for _ in range(tweets))
+    return f'<div>{paragraphs}</div>'
+
+
+def legacy_extract_text(element):
+    return BlueBird.get_processed_text(tostring(element, encoding='unicode'))
+
+
+def main():
+    for emojis in (0, 2, 10):
+        root = document_fromstring(build_items_html(100, emojis))
+        paragraphs = root.xpath('//p[@lang]')
+
+        for paragraph in paragraphs:
+            assert extract_text(paragraph) == legacy_extract_text(paragraph)
+
+        for name, function in (('legacy', legacy_extract_text), ('single-pass', extract_text)):
+            seconds = min(
+                timeit.repeat(lambda: [function(paragraph) for paragraph in paragraphs],
+                              number=20,
+                              repeat=5))
+            per_tweet = seconds / (20 * len(paragraphs)) * 1e6
+            print(f'emojis={emojis:<3} {name:<12} {per_tweet:8.2f} µs/tweet')
+
+
+if __name__ == '__main__':
+    main()
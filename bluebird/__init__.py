@@ -2,5 +2,22 @@
 # -*- coding: utf-8 -*-
 
 from .scraper import BlueBird
+from .async_scraper import AsyncBlueBird
+from .token_pool import GuestTokenPool, GuestTokenCache
+from .rate_limit import RateLimitScheduler
+from .retry import RetryPolicy, RetryError, CircuitOpenError
+from .metrics import MetricsCollector, add_hook, remove_hook
+from .transport import Transport
+from .http_cache import HTTPCache
+from .decoding import JSONDecoder
+from .query import QueryCompiler
+from .records import Tweet, User
+from .multiplex import StreamMultiplexer
+from .dedup import SortedIdSet, BloomFilter
+from .graph import FollowGraph, FollowGraphCrawler
+from .aggregation import StreamAggregator, WindowedCounter
+from .sinks import JSONLSink, ColumnarSink
+from .jobs import JobRunner
+from .checkpoint import MemoryCheckpointStore, FileCheckpointStore, SQLiteCheckpointStore
 
 __version__ = '0.0.9a'
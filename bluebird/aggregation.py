@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from .optional import import_optional
+from array import array
+from collections import deque
+from heapq import nlargest
+from threading import Lock
+import time
+import re
+
+hashtag_regex = re.compile(r'(?:^|[^\w&])#(\w+)')
+mention_regex = re.compile(r'(?:^|[^\w])@(\w{1,15})')
+
+
+class WindowedCounter:
+    """
+    Sliding-window counter split in `buckets` slots. Keys are interned into
+    integer slots of a flat array of totals, which are recycled once a key
+    leaves the window, so memory depends on the keys seen within the window.
+    """
+
+    def __init__(self, window=3600, buckets=60, max_keys=100000):
+        self.window = window
+        self.bucket_span = window / buckets
+        self.max_keys = max_keys
+        self.dropped = 0
+
+        self._indexes = dict()
+        self._keys = list()
+        self._free = list()
+        self._totals = array('q')
+        self._buckets = deque()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._indexes)
+
+    def add(self, key, n=1, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+        bucket_id = int(timestamp // self.bucket_span)
+
+        with self._lock:
+            self._expire(bucket_id)
+
+            index = self._indexes.get(key)
+            if index is None:
+                index = self._intern(key)
+                if index is None:
+                    self.dropped += n
+                    return
+
+            if not self._buckets or self._buckets[-1][0] < bucket_id:
+                self._buckets.append((bucket_id, dict()))
+            counts = self._buckets[-1][1]
+            counts[index] = counts.get(index, 0) + n
+            self._totals[index] += n
+
+    def count(self, key):
+        with self._lock:
+            self._expire(int(time.time() // self.bucket_span))
+            index = self._indexes.get(key)
+            if index is None:
+                return 0
+            return self._totals[index]
+
+    def rate(self, key):
+        return self.count(key) / self.window
+
+    def top(self, k=10):
+        with self._lock:
+            self._expire(int(time.time() // self.bucket_span))
+            if not self._indexes:
+                return []
+
+            numpy = import_optional('numpy')
+            if numpy is not None:
+                totals = numpy.frombuffer(self._totals, dtype=numpy.int64)
+                k = min(k, len(totals))
+                indexes = numpy.argpartition(totals, -k)[-k:]
+                indexes = indexes[numpy.argsort(totals[indexes])[::-1]].tolist()
+                # Release the buffer so the array can keep growing
+                del totals
+            else:
+                indexes = nlargest(k, range(len(self._totals)), key=self._totals.__getitem__)
+
+            return [(self._keys[index], self._totals[index]) for index in indexes
+                    if self._totals[index] > 0]
+
+    def _intern(self, key):
+        if self._free:
+            index = self._free.pop()
+            self._keys[index] = key
+        elif len(self._keys) < self.max_keys:
+            index = len(self._keys)
+            self._keys.append(key)
+            self._totals.append(0)
+        else:
+            return
+        self._indexes[key] = index
+        return index
+
+    def _expire(self, bucket_id):
+        oldest_bucket_id = bucket_id - int(self.window / self.bucket_span) + 1
+        while self._buckets and self._buckets[0][0] < oldest_bucket_id:
+            _, counts = self._buckets.popleft()
+            for index, n in counts.items():
+                self._totals[index] -= n
+                if not self._totals[index]:
+                    del self._indexes[self._keys[index]]
+                    self._keys[index] = None
+                    self._free.append(index)
+
+
+def get_entities(tweet):
+    # Normalizes the web, API 1.1 and API 2 tweet shapes
+    text = tweet.get('full_text') or tweet.get('text') or ''
+
+    entities = tweet.get('entities')
+    if entities:
+        hashtags = [hashtag['text'] for hashtag in entities.get('hashtags', ())]
+        mentions = [mention['screen_name'] for mention in entities.get('user_mentions', ())]
+    else:
+        hashtags = hashtag_regex.findall(text)
+        mentions = mention_regex.findall(text)
+
+    language = tweet.get('lang') or tweet.get('language')
+
+    if 'user_id_str' in tweet:
+        author = tweet['user_id_str']
+    elif 'user' in tweet:
+        author = tweet['user'].get('screen_name') or tweet['user'].get('id_str')
+    else:
+        author = None
+
+    return {
+        'hashtags': [hashtag.lower() for hashtag in hashtags],
+        'mentions': [mention.lower() for mention in mentions],
+        'languages': [language] if language else [],
+        'authors': [author] if author else []
+    }
+
+
+class StreamAggregator:
+
+    DIMENSIONS = ('hashtags', 'mentions', 'languages', 'authors')
+
+    def __init__(self, window=3600, buckets=60, max_keys=100000, dimensions=DIMENSIONS):
+        self.counters = {
+            dimension: WindowedCounter(window, buckets, max_keys)
+            for dimension in dimensions
+        }
+        self.tweets = WindowedCounter(window, buckets, 1)
+
+    def add(self, tweet, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+        self.tweets.add(None, timestamp=timestamp)
+        for dimension, keys in get_entities(tweet).items():
+            counter = self.counters.get(dimension)
+            if counter is None:
+                continue
+            for key in keys:
+                counter.add(key, timestamp=timestamp)
+
+    def consume(self, tweets):
+        for tweet in tweets:
+            self.add(tweet)
+            yield tweet
+
+    def top(self, dimension, k=10):
+        return self.counters[dimension].top(k)
+
+    def count(self, dimension, key):
+        return self.counters[dimension].count(key)
+
+    def rate(self, dimension=None, key=None):
+        # Tweets per second within the window, overall or for a given key
+        if dimension is None:
+            return self.tweets.rate(None)
+        return self.counters[dimension].rate(key)
@@ -0,0 +1,352 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from .scraper import BlueBird
+from .streaming import AsyncStreamPoller
+from .http_helper import TwitterHttpHelper as HttpHelper
+from .token_pool import GuestTokenPool
+from .rate_limit import RateLimitScheduler
+from .retry import RetryPolicy, RetryableError
+from .optional import import_optional
+from .decoding import get_default_decoder
+from .cache import LRUCache
+from . import metrics
+import asyncio
+
+
+class AsyncBlueBird:
+
+    API_WEB = BlueBird.API_WEB
+    API_1_1 = BlueBird.API_1_1
+    API_2 = BlueBird.API_2
+
+    def __init__(self, connections=100, connections_per_host=0, timeout=30, guest_tokens=1,
+                 token_pool=None,
+                 rate_limits=None,
+                 retry_policy=None,
+                 token_cache=None,
+                 user_cache_size=100000,
+                 user_cache_ttl=86400):
+        if import_optional('aiohttp') is None:
+            raise ImportError('AsyncBlueBird requires aiohttp (pip install bluebird[async])')
+        if token_pool is None:
+            token_pool = GuestTokenPool(size=guest_tokens, prewarm=False, cache=token_cache)
+        self.connections = connections
+        self.connections_per_host = connections_per_host
+        self.timeout = timeout
+        self.guest_tokens = token_pool
+        if rate_limits is None:
+            rate_limits = RateLimitScheduler()
+        self.rate_limits = rate_limits
+        if retry_policy is None:
+            retry_policy = RetryPolicy()
+        self.retry_policy = retry_policy
+        self.user_ids = LRUCache(user_cache_size, user_cache_ttl)
+        self.user_names = LRUCache(user_cache_size, user_cache_ttl)
+        self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _get_session(self):
+        # The session must be created inside the running loop
+        if self._session is None:
+            aiohttp = import_optional('aiohttp')
+            connector = aiohttp.TCPConnector(limit=self.connections,
+                                             limit_per_host=self.connections_per_host)
+            timeout = aiohttp.ClientTimeout(total=self.timeout)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return self._session
+
+    async def _acquire_guest_token(self, endpoint):
+        guest_token = self.rate_limits.try_acquire(endpoint, self.guest_tokens)
+        if guest_token is None:
+            # Wait for a token or a rate limit reset without blocking the loop
+            loop = asyncio.get_running_loop()
+            guest_token = await loop.run_in_executor(None, self.rate_limits.acquire, endpoint,
+                                                     self.guest_tokens)
+        return guest_token
+
+    async def _get_api_response(self, url):
+        endpoint = RateLimitScheduler.get_endpoint(url)
+        return await self.retry_policy.call_async(endpoint, self._request_api, url, endpoint)
+
+    async def _request_api(self, url, endpoint):
+        guest_token = await self._acquire_guest_token(endpoint)
+
+        headers = BlueBird._get_auth_header(guest_token=guest_token.value)
+        started = metrics.start()
+        async with self._get_session().get(url, headers=headers) as response:
+            body = await response.read()
+        metrics.observe('request_seconds', started, endpoint=endpoint, status=response.status)
+        metrics.emit('response_bytes', len(body), endpoint=endpoint)
+        # Rate limits first, a 429 body isn't necessarily JSON
+        self.rate_limits.update(endpoint, guest_token, response.headers, response.status)
+        if response.status == 429:
+            raise RetryableError(f'{endpoint} is rate limited')
+
+        data = get_default_decoder().loads(body)
+        error = BlueBird._get_api_error(data)
+        if error == BlueBird.ERROR_FATAL:
+            return
+        elif error == BlueBird.ERROR_RATE_LIMITED:
+            self.rate_limits.exhaust(endpoint, guest_token)
+        elif error == BlueBird.ERROR_FORBIDDEN:
+            self.guest_tokens.retire(guest_token)
+        elif error is None:
+            return data
+        # Transient errors keep the token, the retry takes the next one of the pool
+        raise RetryableError(f'{endpoint} answered {data["errors"][0]["message"]!r}')
+
+    async def _get_json_response(self, url):
+        async with self._get_session().get(url, headers=HttpHelper.get_json_header()) as response:
+            return await response.json(content_type=None)
+
+    async def _get_html_response(self, url):
+        async with self._get_session().get(url, headers=HttpHelper.get_html_header()) as response:
+            return await response.text(encoding='utf-8')
+
+    async def get_user_by_name(self, username):
+        url = f'https://api.twitter.com/1.1/users/show.json?screen_name={username}'
+        return await self._get_api_response(url)
+
+    async def get_user_by_id(self, user_id):
+        url = f'https://api.twitter.com/1.1/users/show.json?id={user_id}'
+        return await self._get_api_response(url)
+
+    def _cache_user(self, user):
+        self.user_ids.set(user['screen_name'].lower(), user['id'])
+        self.user_names.set(str(user['id']), user['screen_name'])
+
+    async def get_user_id(self, username):
+        user_id = self.user_ids.get(username.lower())
+        if user_id is None:
+            user = await self.get_user_by_name(username)
+            self._cache_user(user)
+            user_id = user['id']
+        return user_id
+
+    async def get_screen_name(self, user_id):
+        screen_name = self.user_names.get(str(user_id))
+        if screen_name is None:
+            user = await self.get_user_by_id(user_id)
+            self._cache_user(user)
+            screen_name = user['screen_name']
+        return screen_name
+
+    async def _get_tweets_web(self, url, deep, sleep_time, query_type, min_tweets):
+        seen_tweets = 0
+        position = BlueBird._get_initial_position_web(query_type)
+        url = BlueBird._get_web_url(url)
+
+        has_more_items = True
+        while has_more_items:
+            new_url = f'{url}{position}&reset_error_state=false'
+            content, tweets = await self.retry_policy.call_async(f'web/{query_type}',
+                                                                 self._get_tweets_page_web,
+                                                                 new_url)
+
+            has_more_items = content['has_more_items']
+            if not deep:
+                has_more_items = False
+
+            if 'min_position' in content:
+                position = f"&max_position={content['min_position']}"
+            else:
+                continue
+
+            for tweet in tweets:
+                seen_tweets += 1
+                yield tweet
+
+            # Top up from the last position if the min_tweets target wasn't achieved
+            if not has_more_items and BlueBird._below_target(seen_tweets, min_tweets):
+                has_more_items = True
+
+            if has_more_items:
+                await asyncio.sleep(sleep_time)
+
+    async def _get_tweets_page_web(self, url):
+        content = await self._get_json_response(url)
+        return content, BlueBird._parse_tweets_web(content['items_html'])
+
+    async def _get_tweets_2(self, url, deep, sleep_time, min_tweets):
+        seen_tweets = 0
+
+        cursor = None
+        done = False
+
+        while not done:
+            new_url = url
+            if cursor is not None:
+                new_url += f'&cursor={cursor}'
+
+            response = await self._get_api_response(new_url)
+            if response is None:
+                break
+
+            tweets = response['globalObjects']['tweets']
+
+            done = True
+            for tweet_id, tweet in tweets.items():
+                seen_tweets += 1
+
+                tweet['id'] = tweet_id
+                done = False
+                yield tweet
+
+            next_cursor = BlueBird._get_cursor_2(response)
+            if next_cursor is None:
+                done = True
+            else:
+                cursor = next_cursor
+
+            # Top up from the last cursor if the min_tweets target wasn't achieved
+            if done and BlueBird._below_target(seen_tweets, min_tweets):
+                done = False
+                await asyncio.sleep(sleep_time)
+
+    async def _get_tweets_1_1(self, url, deep, sleep_time, min_tweets):
+        seen_tweets = 0
+
+        max_id = None
+        done = False
+        while not done:
+            new_url = url
+            if max_id is not None:
+                new_url += f'&max_id={max_id}'
+
+            tweets = None
+            attempts = 10
+            retry = True
+            while attempts and retry and not done:
+                attempts -= 1
+                response = await self._get_api_response(new_url)
+                tweets = BlueBird._get_tweets_from_response_1_1(response)
+
+                retry = True
+                new_tweets = False
+                for tweet in tweets:
+                    retry = False
+                    # max_id is inclusive, the page starts with the last tweet of the previous one
+                    if max_id == tweet['id']:
+                        continue
+                    seen_tweets += 1
+                    new_tweets = True
+                    max_id = tweet['id']
+                    yield tweet
+
+                if not retry and not new_tweets:
+                    done = True
+
+            if not tweets:
+                done = True
+
+            # Top up from the last max_id if the min_tweets target wasn't achieved
+            if done and BlueBird._below_target(seen_tweets, min_tweets):
+                done = False
+            elif not deep:
+                done = True
+
+            if not done:
+                await asyncio.sleep(sleep_time)
+
+    def _search_web(self, query, deep, count, sleep_time, min_tweets):
+        url = BlueBird._get_search_url_web(query)
+        return self._get_tweets_web(url, deep, sleep_time, 'search', min_tweets)
+
+    def _search_1_1(self, query, deep, count, sleep_time, min_tweets):
+        url = BlueBird._get_search_url_1_1(query, count)
+        return self._get_tweets_1_1(url, deep, sleep_time, min_tweets)
+
+    def _search_2(self, query, deep, count, sleep_time, min_tweets):
+        url = BlueBird._get_search_url_2(query, count)
+        return self._get_tweets_2(url, deep, sleep_time, min_tweets)
+
+    def _user_timeline_web(self, username, deep, count, include_replies, sleep_time, min_tweets):
+        url = BlueBird._get_user_timeline_url_web(username)
+        return self._get_tweets_web(url, deep, sleep_time, 'user', min_tweets)
+
+    def _user_timeline_1_1(self, username, deep, count, include_replies, sleep_time, min_tweets):
+        url = BlueBird._get_user_timeline_url_1_1(username, count, include_replies)
+        return self._get_tweets_1_1(url, deep, sleep_time, min_tweets)
+
+    async def _user_timeline_2(self, username, deep, count, include_replies, sleep_time,
+                               min_tweets):
+        user_id = await self.get_user_id(username)
+        url = BlueBird._get_user_timeline_url_2(user_id, count, include_replies)
+        async for tweet in self._get_tweets_2(url, deep, sleep_time, min_tweets):
+            yield tweet
+
+    def search(self, query, deep=False, count=100, sleep_time=0, min_tweets=0, mode=API_2):
+        return getattr(self, f'_search_{mode}')(query, deep, count, sleep_time, min_tweets)
+
+    def user_timeline(self,
+                      username,
+                      deep=False,
+                      count=200,
+                      include_replies=True,
+                      sleep_time=0,
+                      min_tweets=0,
+                      mode=API_2):
+        return getattr(self, f'_user_timeline_{mode}')(username, deep, count, include_replies,
+                                                       sleep_time, min_tweets)
+
+    def stream(self, query, sleep_time=0, mode=API_2, max_sleep_time=60, on_error=None):
+        return AsyncStreamPoller(self,
+                                 query,
+                                 mode,
+                                 min_interval=sleep_time,
+                                 max_interval=max(sleep_time, max_sleep_time),
+                                 on_error=on_error).__aiter__()
+
+    async def get_list_members(self, username, list_name):
+        has_more_items = True
+        min_position = -1
+
+        while has_more_items:
+            url = BlueBird._get_list_members_url(username, list_name, min_position)
+            content, members = await self.retry_policy.call_async(
+                'web/list_members', self._get_list_members_page, url)
+
+            has_more_items = content['has_more_items']
+            min_position = content['min_position']
+
+            for member in members:
+                yield member
+
+    async def _get_list_members_page(self, url):
+        content = await self._get_json_response(url)
+        return content, BlueBird._parse_list_members(content['items_html'])
+
+    def get_followings(self, username):
+        return self.get_followx(username, target='followings')
+
+    def get_followers(self, username):
+        return self.get_followx(username, target='followers')
+
+    async def get_followx(self, username, target):
+        has_more_items = True
+        min_position = 0
+
+        while has_more_items:
+            url = BlueBird._get_followx_url(username, target, min_position)
+            screen_names, min_position = await self.retry_policy.call_async(
+                f'mobile/{target}', self._get_followx_page, url)
+
+            for screen_name in screen_names:
+                yield screen_name
+
+            if min_position is None:
+                has_more_items = False
+
+    async def _get_followx_page(self, url):
+        return BlueBird._parse_followx(await self._get_html_response(url))
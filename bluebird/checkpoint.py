@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from abc import ABC, abstractmethod
+from hashlib import sha1
+from threading import Lock
+import sqlite3
+import json
+import time
+import os
+
+
+def get_checkpoint_key(url):
+    return sha1(url.encode('utf-8')).hexdigest()
+
+
+class CheckpointStore(ABC):
+    @abstractmethod
+    def load(self, key):
+        pass
+
+    @abstractmethod
+    def save(self, key, state):
+        pass
+
+    @abstractmethod
+    def delete(self, key):
+        pass
+
+
+class MemoryCheckpointStore(CheckpointStore):
+    def __init__(self):
+        self.states = dict()
+
+    def load(self, key):
+        return self.states.get(key)
+
+    def save(self, key, state):
+        self.states[key] = dict(state)
+
+    def delete(self, key):
+        self.states.pop(key, None)
+
+
+class FileCheckpointStore(CheckpointStore):
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _get_path(self, key):
+        return os.path.join(self.directory, f'{key}.json')
+
+    def load(self, key):
+        try:
+            with open(self._get_path(key)) as checkpoint_file:
+                return json.load(checkpoint_file)
+        except FileNotFoundError:
+            return
+
+    def save(self, key, state):
+        # Write and rename, so a crash never leaves a truncated checkpoint
+        path = self._get_path(key)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as checkpoint_file:
+            json.dump(state, checkpoint_file)
+        os.replace(tmp_path, path)
+
+    def delete(self, key):
+        try:
+            os.remove(self._get_path(key))
+        except FileNotFoundError:
+            pass
+
+
+class SQLiteCheckpointStore(CheckpointStore):
+    def __init__(self, path):
+        self.path = path
+        self._lock = Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('CREATE TABLE IF NOT EXISTS checkpoints '
+                                 '(key TEXT PRIMARY KEY, state TEXT, updated_at REAL)')
+
+    def load(self, key):
+        with self._lock:
+            row = self._connection.execute('SELECT state FROM checkpoints WHERE key = ?',
+                                           (key, )).fetchone()
+        if row is not None:
+            return json.loads(row[0])
+
+    def save(self, key, state):
+        with self._lock:
+            self._connection.execute('INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?)',
+                                     (key, json.dumps(state), time.time()))
+
+    def delete(self, key):
+        with self._lock:
+            self._connection.execute('DELETE FROM checkpoints WHERE key = ?', (key, ))
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class CheckpointOperation:
+    __slots__ = ('function', 'args')
+
+    def __init__(self, function, args):
+        self.function = function
+        self.args = args
+
+    def apply(self):
+        self.function(*self.args)
+
+
+class DeferredCheckpointStore(CheckpointStore):
+    """
+    Store for a crawl that runs ahead of its consumer in another thread. Its
+    saves and deletes travel with the tweets as CheckpointOperation items
+    (see `wrap`), and are only applied to `store` once the consumer has read
+    every tweet before them.
+    """
+
+    def __init__(self, store):
+        # Nested crawls apply their operations to the same underlying store
+        if isinstance(store, DeferredCheckpointStore):
+            store = store.store
+        self.store = store
+        self.operations = []
+
+    def load(self, key):
+        return self.store.load(key)
+
+    def save(self, key, state):
+        self.operations.append(CheckpointOperation(self.store.save, (key, dict(state))))
+
+    def delete(self, key):
+        self.operations.append(CheckpointOperation(self.store.delete, (key, )))
+
+    def wrap(self, items):
+        operations = self.operations
+        for item in items:
+            if operations:
+                yield from operations
+                operations.clear()
+            yield item
+        yield from operations
+        operations.clear()
+
+
+def apply_checkpoint_operations(items):
+    for item in items:
+        if isinstance(item, CheckpointOperation):
+            item.apply()
+        else:
+            yield item
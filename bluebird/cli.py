@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Runs the jobs of a JSONL spec file, one job per line:
+#
+#   {"id": "news", "type": "search", "query": {"fields": [{"items": ["news"]}]}, "deep": true}
+#   {"type": "user_timeline", "username": "username", "mode": "1_1", "limit": 1000}
+#   {"type": "followers", "username": "username"}
+#
+#   bluebird jobs.jsonl --workers 8 --output-dir results/
+#   bluebird jobs.jsonl --workers 8 --output results.jsonl.gz
+
+from .scraper import BlueBird
+from .token_pool import GuestTokenCache
+from .jobs import JobRunner, load_jobs, JOB_TYPES
+from argparse import ArgumentParser
+import logging
+import sys
+
+
+def main(args=None):
+    parser = ArgumentParser(prog='bluebird', description='Run BlueBird jobs from a JSONL file')
+    parser.add_argument('jobs', help=f'JSONL job spec ("-" for stdin), with types: '
+                        f'{", ".join(JOB_TYPES)}')
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument('-o', '--output', help='merged JSONL output, tagged with the job IDs')
+    output.add_argument('-d', '--output-dir', help='directory for one JSONL file per job')
+    parser.add_argument('-w', '--workers', type=int, default=4, help='concurrent jobs')
+    parser.add_argument('--guest-tokens', type=int, help='guest token pool size (default: workers)')
+    parser.add_argument('--token-cache', help='file to reuse guest tokens between runs')
+    parser.add_argument('--parse-workers', type=int, help='HTML parsing processes')
+    parser.add_argument('--compresslevel',
+                        type=int,
+                        help='gzip level (default: 6 for .gz outputs and output dirs, else 0)')
+    parser.add_argument('--progress-interval', type=float, default=10, help='seconds, 0 to disable')
+    args = parser.parse_args(args)
+
+    logging.basicConfig(format='%(levelname)s %(message)s')
+
+    try:
+        if args.jobs == '-':
+            jobs = load_jobs(sys.stdin)
+        else:
+            with open(args.jobs, encoding='utf-8') as jobs_file:
+                jobs = load_jobs(jobs_file)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    compresslevel = args.compresslevel
+    if compresslevel is None:
+        compresslevel = 6 if args.output is None or args.output.endswith('.gz') else 0
+
+    token_cache = GuestTokenCache(args.token_cache) if args.token_cache else None
+    bluebird = BlueBird(guest_tokens=args.guest_tokens or args.workers,
+                        parse_workers=args.parse_workers,
+                        token_cache=token_cache)
+    runner = JobRunner(bluebird,
+                       workers=args.workers,
+                       output=args.output,
+                       output_dir=args.output_dir,
+                       compresslevel=compresslevel,
+                       progress_interval=args.progress_interval)
+    try:
+        stats = runner.run(jobs)
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        bluebird.guest_tokens.close()
+        bluebird.close()
+    return 1 if stats['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
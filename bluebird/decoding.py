@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from .optional import import_optional
+from threading import Lock, local
+import json
+
+
+class JSONDecoder:
+    """
+    Decodes response bodies straight from bytes with the fastest available
+    backend (orjson, simdjson or json). In lazy mode, API v2 pages only get
+    the tweets map and the cursor path materialized (requires simdjson).
+    """
+
+    BACKENDS = ('orjson', 'simdjson', 'json')
+
+    def __init__(self, backend='auto', lazy=False):
+        if backend == 'auto':
+            backend = next(name for name in JSONDecoder.BACKENDS if JSONDecoder.is_available(name))
+        elif not JSONDecoder.is_available(backend):
+            raise ImportError(f'the {backend} JSON backend is not installed')
+        if lazy and not JSONDecoder.is_available('simdjson'):
+            raise ImportError('lazy decoding requires simdjson (pip install bluebird[json])')
+
+        self.backend = backend
+        self.lazy = lazy
+        self._local = local()
+
+        if backend == 'orjson':
+            self.loads = import_optional('orjson').loads
+        elif backend == 'simdjson':
+            self.loads = self._loads_simdjson
+        else:
+            self.loads = json.loads
+
+    @staticmethod
+    def is_available(backend):
+        if backend in ('orjson', 'simdjson'):
+            return import_optional(backend) is not None
+        return backend == 'json'
+
+    def _get_parser(self):
+        # Documents are only valid until their parser is reused, so one per thread
+        parser = getattr(self._local, 'parser', None)
+        if parser is None:
+            parser = self._local.parser = import_optional('simdjson').Parser()
+        return parser
+
+    def _loads_simdjson(self, data):
+        return self._get_parser().parse(data, recursive=True)
+
+    def loads_page_2(self, data):
+        if not self.lazy:
+            return self.loads(data)
+
+        document = self._get_parser().parse(data)
+        keys = set(document.keys())
+        if 'errors' in keys or 'globalObjects' not in keys:
+            return document.as_dict()
+
+        page = {'globalObjects': {'tweets': document.at_pointer('/globalObjects/tweets').as_dict()}}
+        try:
+            instructions = document.at_pointer('/timeline/instructions')
+        except (KeyError, IndexError, ValueError):
+            return page
+
+        if not len(instructions):
+            page['timeline'] = {'instructions': []}
+            return page
+
+        # The cursor is the last entry of the first instruction or a replaceEntry in the last one
+        first = instructions[0]
+        try:
+            entries = first.at_pointer('/addEntries/entries')
+            first_entries = [entries[len(entries) - 1].as_dict()] if len(entries) else []
+            first = {'addEntries': {'entries': first_entries}}
+        except (KeyError, IndexError, ValueError):
+            # e.g. a single replaceEntry instruction, which carries the cursor itself
+            first = first.as_dict()
+
+        page['timeline'] = {'instructions': [first]}
+        if len(instructions) > 1:
+            page['timeline']['instructions'].append(instructions[len(instructions) - 1].as_dict())
+        return page
+
+
+_default_decoder = None
+_default_decoder_lock = Lock()
+
+
+def get_default_decoder():
+    global _default_decoder
+    if _default_decoder is None:
+        with _default_decoder_lock:
+            if _default_decoder is None:
+                _default_decoder = JSONDecoder()
+    return _default_decoder
+
+
+def __getattr__(name):
+    # default_decoder picks its backend on first use instead of at import time
+    if name == 'default_decoder':
+        return get_default_decoder()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
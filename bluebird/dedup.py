@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from abc import ABC, abstractmethod
+from array import array
+from bisect import bisect_left
+from heapq import merge
+from math import ceil, log
+from threading import Lock
+import mmap
+import struct
+import os
+
+MASK_64 = (1 << 64) - 1
+
+
+def _mix64(value):
+    # splitmix64 finalizer, spreads snowflake IDs (sequential in their low bits)
+    value = (value + 0x9E3779B97F4A7C15) & MASK_64
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & MASK_64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & MASK_64
+    return value ^ (value >> 31)
+
+
+class IdStore(ABC):
+    @abstractmethod
+    def add(self, value):
+        pass
+
+    @abstractmethod
+    def __contains__(self, value):
+        pass
+
+    @abstractmethod
+    def __len__(self):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def filter(self, items, key=lambda item: item['id']):
+        for item in items:
+            if self.add(int(key(item))):
+                yield item
+
+
+class SortedIdSet(IdStore):
+    """
+    Exact set of 64-bit IDs stored as a sorted uint64 array (8 bytes per ID),
+    optionally memory-mapped from `path`. New IDs are buffered and merged into
+    the array in batches, which keeps inserts amortized O(1). Until they are
+    merged, they are appended to a `{path}.journal` file every `journal_size`
+    IDs and on flush, so a crash only loses the last `journal_size` IDs.
+    """
+
+    def __init__(self, path=None, merge_threshold=65536, journal_size=1024):
+        self.path = path
+        self.merge_threshold = merge_threshold
+        self.journal_size = journal_size
+        self._buffer = set()
+        self._lock = Lock()
+        self._file = None
+        self._mmap = None
+        self._ids = array('Q')
+        self._journal = None
+        self._pending = array('Q')
+
+        if path is not None:
+            if os.path.exists(path) and os.path.getsize(path):
+                self._map(path)
+            self._open_journal(f'{path}.journal')
+
+    def _open_journal(self, journal_path):
+        # IDs of a previous run that weren't merged yet, a torn last write is dropped
+        if os.path.exists(journal_path):
+            with open(journal_path, 'rb') as journal:
+                data = journal.read()
+            journal_ids = array('Q')
+            journal_ids.frombytes(data[:len(data) - len(data) % journal_ids.itemsize])
+            self._buffer.update(value for value in journal_ids if not self._contains(value))
+        self._journal = open(journal_path, 'ab')
+
+    def _write_journal(self):
+        if self._journal is not None and self._pending:
+            self._pending.tofile(self._journal)
+            self._journal.flush()
+        self._pending = array('Q')
+
+    def _map(self, path):
+        self._file = open(path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._ids = memoryview(self._mmap).cast('Q')
+
+    def _unmap(self):
+        if self._mmap is not None:
+            self._ids.release()
+            self._mmap.close()
+            self._file.close()
+            self._mmap = None
+            self._file = None
+        self._ids = array('Q')
+
+    def _contains(self, value):
+        if value in self._buffer:
+            return True
+        index = bisect_left(self._ids, value)
+        return index < len(self._ids) and self._ids[index] == value
+
+    def __contains__(self, value):
+        with self._lock:
+            return self._contains(int(value))
+
+    def __len__(self):
+        return len(self._ids) + len(self._buffer)
+
+    def add(self, value):
+        value = int(value)
+        with self._lock:
+            if self._contains(value):
+                return False
+            self._buffer.add(value)
+            if len(self._buffer) >= max(self.merge_threshold, len(self._ids) // 8):
+                self._merge()
+            elif self._journal is not None:
+                self._pending.append(value)
+                if len(self._pending) >= self.journal_size:
+                    self._write_journal()
+            return True
+
+    def _merge(self):
+        if not self._buffer:
+            return
+        merged = merge(self._ids, sorted(self._buffer))
+        if self.path is None:
+            self._ids = array('Q', merged)
+        else:
+            tmp_path = f'{self.path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as ids_file:
+                chunk = array('Q')
+                for value in merged:
+                    chunk.append(value)
+                    if len(chunk) >= 65536:
+                        chunk.tofile(ids_file)
+                        chunk = array('Q')
+                chunk.tofile(ids_file)
+            self._unmap()
+            os.replace(tmp_path, self.path)
+            self._map(self.path)
+            # Everything journaled is in the array now
+            self._journal.truncate(0)
+            self._pending = array('Q')
+        self._buffer = set()
+
+    def flush(self):
+        with self._lock:
+            self._merge()
+
+    def close(self):
+        with self._lock:
+            self._merge()
+            self._unmap()
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+                os.remove(f'{self.path}.journal')
+
+
+class BloomFilter(IdStore):
+    """
+    Probabilistic set of 64-bit IDs with a configurable false-positive rate
+    (about 1.2 bytes per ID at 1%), optionally memory-mapped from `path`.
+    A false positive makes a new ID look like a duplicate, never the opposite.
+    """
+
+    HEADER = struct.Struct('<8sQQQ')
+    MAGIC = b'BBBLOOM1'
+
+    def __init__(self, capacity=10000000, error_rate=0.001, path=None):
+        self.path = path
+        self._lock = Lock()
+        self._file = None
+
+        if path is not None and os.path.exists(path) and os.path.getsize(path):
+            self._file = open(path, 'r+b')
+            self._mmap = mmap.mmap(self._file.fileno(), 0)
+            magic, self.bits, self.hashes, self.count = BloomFilter.HEADER.unpack_from(self._mmap)
+            if magic != BloomFilter.MAGIC:
+                raise ValueError(f'{path} is not a bloom filter file')
+        else:
+            self.bits = max(8, ceil(-capacity * log(error_rate) / log(2)**2))
+            self.hashes = max(1, round(self.bits / capacity * log(2)))
+            self.count = 0
+            size = BloomFilter.HEADER.size + ceil(self.bits / 8)
+            if path is None:
+                self._mmap = bytearray(size)
+            else:
+                self._file = open(path, 'w+b')
+                self._file.truncate(size)
+                self._mmap = mmap.mmap(self._file.fileno(), 0)
+            self._write_header()
+
+        self._offset = BloomFilter.HEADER.size
+
+    def _write_header(self):
+        BloomFilter.HEADER.pack_into(self._mmap, 0, BloomFilter.MAGIC, self.bits, self.hashes,
+                                     self.count)
+
+    def _positions(self, value):
+        hash_1 = _mix64(value)
+        hash_2 = _mix64(hash_1) | 1
+        for i in range(self.hashes):
+            yield ((hash_1 + i * hash_2) & MASK_64) % self.bits
+
+    def __contains__(self, value):
+        offset = self._offset
+        for position in self._positions(int(value)):
+            if not self._mmap[offset + (position >> 3)] & (1 << (position & 7)):
+                return False
+        return True
+
+    def __len__(self):
+        return self.count
+
+    def add(self, value):
+        offset = self._offset
+        new = False
+        with self._lock:
+            for position in self._positions(int(value)):
+                index = offset + (position >> 3)
+                bit = 1 << (position & 7)
+                byte = self._mmap[index]
+                if not byte & bit:
+                    self._mmap[index] = byte | bit
+                    new = True
+            if new:
+                self.count += 1
+        return new
+
+    def flush(self):
+        with self._lock:
+            self._write_header()
+            if self._file is not None:
+                self._mmap.flush()
+
+    def close(self):
+        self.flush()
+        if self._file is not None:
+            self._mmap.close()
+            self._file.close()
+            self._file = None
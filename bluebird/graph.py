@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from .optional import import_optional
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from itertools import islice
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+class FollowGraph:
+    """
+    Directed "follows" graph with screen names interned into consecutive
+    integer node IDs. Edges are kept as two parallel uint32 arrays (source
+    follows target) and can be exported in CSR form. With a `path`, every
+    change is appended to files in that directory, so a crawl can resume.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.ids = dict()
+        self.names = []
+        self.depths = array('B')
+        self.expanded = bytearray()
+        self.sources = array('I')
+        self.targets = array('I')
+
+        self._nodes_file = None
+        self._edges_file = None
+        self._expanded_file = None
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+            self._load()
+            self._nodes_file = open(os.path.join(path, 'nodes.txt'), 'a', encoding='utf-8')
+            self._edges_file = open(os.path.join(path, 'edges.bin'), 'ab')
+            self._expanded_file = open(os.path.join(path, 'expanded.bin'), 'ab')
+
+    def _load(self):
+        nodes_path = os.path.join(self.path, 'nodes.txt')
+        if os.path.exists(nodes_path):
+            with open(nodes_path, encoding='utf-8') as nodes_file:
+                for line in nodes_file:
+                    if not line.endswith('\n'):
+                        break
+                    name, _, depth = line.rstrip('\n').rpartition(' ')
+                    self._add_node(name, int(depth))
+
+        # Expansion marks are (node, number of edges written so far) records
+        expanded = array('Q')
+        expanded_path = os.path.join(self.path, 'expanded.bin')
+        if os.path.exists(expanded_path):
+            with open(expanded_path, 'rb') as expanded_file:
+                data = expanded_file.read()
+            expanded.frombytes(data[:len(data) - len(data) % (2 * expanded.itemsize)])
+        committed = 0
+        for i in range(0, len(expanded), 2):
+            self.expanded[expanded[i]] = 1
+            committed = expanded[i + 1]
+
+        # Edges written after the last mark belong to an unfinished expansion
+        edges = array('I')
+        edges_path = os.path.join(self.path, 'edges.bin')
+        if os.path.exists(edges_path):
+            with open(edges_path, 'r+b') as edges_file:
+                edges.frombytes(edges_file.read(committed * 2 * edges.itemsize))
+                edges_file.truncate(committed * 2 * edges.itemsize)
+        self.sources = edges[0::2]
+        self.targets = edges[1::2]
+
+    def __len__(self):
+        return len(self.names)
+
+    def get_id(self, name):
+        return self.ids.get(name.lower())
+
+    def get_name(self, node):
+        return self.names[node]
+
+    def _add_node(self, name, depth):
+        node = len(self.names)
+        self.ids[name] = node
+        self.names.append(name)
+        self.depths.append(min(depth, 255))
+        self.expanded.append(0)
+        return node
+
+    def add_node(self, name, depth=0):
+        name = name.lower()
+        node = self.ids.get(name)
+        if node is not None:
+            if depth < self.depths[node]:
+                self.depths[node] = depth
+            return node, False
+
+        node = self._add_node(name, depth)
+        if self._nodes_file is not None:
+            self._nodes_file.write(f'{name} {depth}\n')
+        return node, True
+
+    def add_edges(self, sources, targets):
+        sources = array('I', sources)
+        targets = array('I', targets)
+        self.sources.extend(sources)
+        self.targets.extend(targets)
+        if self._edges_file is not None:
+            edges = array('I', (node for edge in zip(sources, targets) for node in edge))
+            edges.tofile(self._edges_file)
+
+    def set_expanded(self, node):
+        self.expanded[node] = 1
+        if self._expanded_file is not None:
+            # Nodes go first, then edges, then the expansion mark
+            self._nodes_file.flush()
+            self._edges_file.flush()
+            array('Q', (node, len(self.sources))).tofile(self._expanded_file)
+            self._expanded_file.flush()
+
+    def to_csr(self):
+        """
+        Returns `(indptr, indices)`: the nodes followed by node i are
+        `indices[indptr[i]:indptr[i + 1]]`.
+        """
+        nodes = len(self.names)
+        numpy = import_optional('numpy')
+        if numpy is not None:
+            sources = numpy.frombuffer(self.sources, dtype=numpy.uint32)
+            targets = numpy.frombuffer(self.targets, dtype=numpy.uint32)
+            order = numpy.argsort(sources, kind='stable')
+            indptr = numpy.zeros(nodes + 1, dtype=numpy.uint64)
+            indptr[1:] = numpy.cumsum(numpy.bincount(sources, minlength=nodes))
+            return array('Q', indptr.tobytes()), array('I', targets[order].tobytes())
+
+        counts = array('Q', bytes(8 * (nodes + 1)))
+        for source in self.sources:
+            counts[source + 1] += 1
+        for i in range(nodes):
+            counts[i + 1] += counts[i]
+        indptr = array('Q', counts)
+
+        indices = array('I', bytes(4 * len(self.targets)))
+        for source, target in zip(self.sources, self.targets):
+            indices[counts[source]] = target
+            counts[source] += 1
+        return indptr, indices
+
+    def close(self):
+        for graph_file in (self._nodes_file, self._edges_file, self._expanded_file):
+            if graph_file is not None:
+                graph_file.close()
+        self._nodes_file = self._edges_file = self._expanded_file = None
+
+
+class FollowGraphCrawler:
+    """
+    Breadth-first crawl of the followers (or followings) of the seed users
+    and of the members of the seed lists, up to `max_depth` hops and
+    `max_nodes` nodes. Up to `workers` users are expanded concurrently, each
+    one with at most `max_neighbors` followers (or followings).
+    """
+
+    def __init__(self,
+                 bluebird,
+                 target='followers',
+                 max_depth=1,
+                 max_nodes=1000000,
+                 max_neighbors=None,
+                 workers=8,
+                 path=None):
+        if target not in ('followers', 'followings'):
+            raise ValueError('target must be either followers or followings')
+        self.bluebird = bluebird
+        self.target = target
+        self.max_depth = max_depth
+        self.max_nodes = max_nodes
+        self.max_neighbors = max_neighbors
+        self.workers = workers
+        self.graph = FollowGraph(path)
+        self.failures = 0
+
+    def _get_neighbors(self, username):
+        neighbors = self.bluebird.get_followx(username, self.target)
+        try:
+            return list(islice(neighbors, self.max_neighbors))
+        finally:
+            neighbors.close()
+
+    def _expand(self, node, neighbors):
+        graph = self.graph
+        depth = graph.depths[node] + 1
+        edges = []
+        new_nodes = []
+        for neighbor in neighbors:
+            neighbor_node = graph.get_id(neighbor)
+            if neighbor_node is None:
+                if len(graph) >= self.max_nodes:
+                    continue
+                neighbor_node, _ = graph.add_node(neighbor, depth)
+                new_nodes.append(neighbor_node)
+            edges.append(neighbor_node)
+
+        if self.target == 'followers':
+            graph.add_edges(edges, [node] * len(edges))
+        else:
+            graph.add_edges([node] * len(edges), edges)
+        graph.set_expanded(node)
+        return [new_node for new_node in new_nodes if depth < self.max_depth]
+
+    def crawl(self, usernames=(), lists=()):
+        graph = self.graph
+        for owner, list_name in lists:
+            for member in self.bluebird.get_list_members(owner, list_name):
+                graph.add_node(member['screen_name'])
+        for username in usernames:
+            graph.add_node(username)
+
+        # On resume, every known node that wasn't expanded yet
+        frontier = deque(node for node in range(len(graph))
+                         if not graph.expanded[node] and graph.depths[node] < self.max_depth)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = dict()
+            while frontier or pending:
+                while frontier and len(pending) < self.workers:
+                    node = frontier.popleft()
+                    future = executor.submit(self._get_neighbors, graph.get_name(node))
+                    pending[future] = node
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    node = pending.pop(future)
+                    try:
+                        neighbors = future.result()
+                    except Exception as e:
+                        # Left unexpanded, so the next run tries it again
+                        self.failures += 1
+                        logger.warning('could not expand %s: %r', graph.get_name(node), e)
+                        continue
+                    frontier.extend(self._expand(node, neighbors))
+        return graph
+
+    def close(self):
+        self.graph.close()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from threading import Lock
+import sqlite3
+import json
+import time
+import re
+
+# Endpoint classes worth caching and how long they stay fresh, matched
+# against host + path. Searches and timelines change by the second
+DEFAULT_TTLS = {
+    r'api\.twitter\.com/1\.1/users/(show|lookup)\.json': 86400,
+    r'mobile\.twitter\.com/[^/]+/(followers|following|followings)': 3600,
+    r'twitter\.com/[^/]+/lists/[^/]+/members/timeline': 3600,
+}
+
+# Rate limit headers belong to the request that was made, not to the content
+UNCACHED_HEADERS = ('x-rate-limit-limit', 'x-rate-limit-remaining', 'x-rate-limit-reset',
+                    'set-cookie', 'content-length', 'content-encoding', 'transfer-encoding')
+
+
+def normalize_url(url):
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or '/', query, ''))
+
+
+class CacheEntry:
+    __slots__ = ('status', 'headers', 'data', 'expires_at')
+
+    def __init__(self, status, headers, data, expires_at):
+        self.status = status
+        self.headers = headers
+        self.data = data
+        self.expires_at = expires_at
+
+    def is_fresh(self, now):
+        return now < self.expires_at
+
+    def get_validators(self):
+        headers = dict()
+        if 'etag' in self.headers:
+            headers['if-none-match'] = self.headers['etag']
+        if 'last-modified' in self.headers:
+            headers['if-modified-since'] = self.headers['last-modified']
+        return headers
+
+
+class HTTPCache:
+    """
+    On-disk (SQLite) cache of GET responses, keyed by normalized URL. Only
+    the endpoint classes in `ttls` are cached, each one fresh for its own
+    TTL; stale entries with an ETag or Last-Modified are revalidated with a
+    conditional request. The least recently used entries are evicted when
+    the bodies exceed `max_size` bytes.
+    """
+
+    def __init__(self, path, max_size=256 * 2**20, ttls=None):
+        if ttls is None:
+            ttls = DEFAULT_TTLS
+        self.path = path
+        self.max_size = max_size
+        self.ttls = [(re.compile(pattern), ttl) for pattern, ttl in ttls.items()]
+
+        self.hits = 0
+        self.revalidations = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('CREATE TABLE IF NOT EXISTS responses '
+                                 '(key TEXT PRIMARY KEY, status INTEGER, headers TEXT, data BLOB, '
+                                 'size INTEGER, expires_at REAL, accessed_at REAL)')
+        self._connection.execute('CREATE INDEX IF NOT EXISTS responses_accessed_at '
+                                 'ON responses (accessed_at)')
+        self._size = self._connection.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    def get_ttl(self, url):
+        parts = urlsplit(url)
+        target = f'{parts.netloc.lower()}{parts.path}'
+        for pattern, ttl in self.ttls:
+            if pattern.fullmatch(target):
+                return ttl
+
+    def get(self, key):
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT status, headers, data, expires_at FROM responses WHERE key = ?',
+                (key, )).fetchone()
+            if row is None:
+                return
+            self._connection.execute('UPDATE responses SET accessed_at = ? WHERE key = ?',
+                                     (time.time(), key))
+        status, headers, data, expires_at = row
+        return CacheEntry(status, json.loads(headers), data, expires_at)
+
+    def set(self, key, status, headers, data, ttl):
+        headers = {
+            name.lower(): value
+            for name, value in headers.items() if name.lower() not in UNCACHED_HEADERS
+        }
+        now = time.time()
+        with self._lock:
+            self._delete(key)
+            self._connection.execute('INSERT INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                     (key, status, json.dumps(headers), data, len(data),
+                                      now + ttl, now))
+            self._size += len(data)
+            self._evict()
+        return CacheEntry(status, headers, data, now + ttl)
+
+    def refresh(self, key, entry, ttl):
+        # A 304 renews the entry without transferring the body again
+        entry.expires_at = time.time() + ttl
+        with self._lock:
+            self._connection.execute('UPDATE responses SET expires_at = ? WHERE key = ?',
+                                     (entry.expires_at, key))
+        return entry
+
+    def _delete(self, key):
+        row = self._connection.execute('SELECT size FROM responses WHERE key = ?',
+                                       (key, )).fetchone()
+        if row is not None:
+            self._connection.execute('DELETE FROM responses WHERE key = ?', (key, ))
+            self._size -= row[0]
+
+    def _evict(self):
+        while self._size > self.max_size:
+            rows = self._connection.execute(
+                'SELECT key, size FROM responses ORDER BY accessed_at LIMIT 64').fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                self._connection.execute('DELETE FROM responses WHERE key = ?', (key, ))
+                self._size -= size
+                self.evictions += 1
+                if self._size <= self.max_size:
+                    break
+
+    def clear(self):
+        with self._lock:
+            self._connection.execute('DELETE FROM responses')
+            self._size = 0
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def stats(self):
+        return {
+            'size': self._size,
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'revalidations': self.revalidations,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
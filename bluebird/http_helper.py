@@ -2,16 +2,9 @@
 # -*- coding: utf-8 -*-
 
 from random import randint
-from urllib3 import ProxyManager, PoolManager
-import json
-from os import environ
-
-if 'HTTPS_PROXY' in environ:
-    session = ProxyManager(environ['HTTPS_PROXY'], maxsize=100, block=True)
-elif 'HTTP_PROXY' in environ:
-    session = ProxyManager(environ['HTTP_PROXY'], maxsize=100, block=True)
-else:
-    session = PoolManager(maxsize=100, block=True)
+from .transport import get_default_transport
+from urllib.parse import urlsplit
+from . import metrics
 
 
 class TwitterHttpHelper:
@@ -46,7 +39,6 @@ class TwitterHttpHelper:
     def get_json_header():
         return {
             'accept': 'application/json, text/javascript, */*; q=0.01',
-            'accept-encoding': 'gzip, deflate, br',
             'accept-language': 'en-US,en;q=0.5',
             'user-agent': TwitterHttpHelper.get_user_agent(),
             'x-requested-with': 'XMLHttpRequest',
@@ -57,18 +49,40 @@ class TwitterHttpHelper:
     def get_html_header():
         return {
             'accept': 'text/html, application/xhtml+xml, application/xml;q=0.9, */*;q=0.8',
-            'accept-encoding': 'gzip, deflate, br',
             'accept-language': 'en-US,en;q=0.5',
             'user-agent': '',
             'x-twitter-active-user': 'yes'
         }
 
     @staticmethod
-    def get_json_response(url):
-        r = session.request('GET', url=url, headers=TwitterHttpHelper.get_json_header())
-        return json.loads(r.data.decode('utf-8'))
+    def _request(url, headers, transport, endpoint):
+        if transport is None:
+            transport = get_default_transport()
+        started = metrics.start()
+        r = transport.request('GET', url, headers=headers)
+        metrics.observe('request_seconds', started, endpoint=endpoint, status=r.status)
+        metrics.emit('response_bytes', len(r.data), endpoint=endpoint)
+        return r
+
+    @staticmethod
+    def _get_endpoint(url, endpoint):
+        if endpoint is None and metrics.hooks:
+            return urlsplit(url).netloc
+        return endpoint
+
+    @staticmethod
+    def get_json_response(url, transport=None, decoder=None, endpoint=None):
+        endpoint = TwitterHttpHelper._get_endpoint(url, endpoint)
+        r = TwitterHttpHelper._request(url, TwitterHttpHelper.get_json_header(), transport,
+                                       endpoint)
+        started = metrics.start()
+        data = r.json(decoder)
+        metrics.observe('parse_seconds', started, format='json', endpoint=endpoint)
+        return data
 
     @staticmethod
-    def get_html_response(url):
-        r = session.request('GET', url=url, headers=TwitterHttpHelper.get_html_header())
-        return r.data.decode('utf-8')
+    def get_html_response(url, transport=None, endpoint=None):
+        endpoint = TwitterHttpHelper._get_endpoint(url, endpoint)
+        r = TwitterHttpHelper._request(url, TwitterHttpHelper.get_html_header(), transport,
+                                       endpoint)
+        return r.text()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from .scraper import BlueBird
+from .sinks import JSONLSink, _to_dict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from threading import Event, Lock, Thread
+import logging
+import json
+import time
+import sys
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+# Job types and the BlueBird methods that run them
+JOB_TYPES = {
+    'search': 'search',
+    'user_timeline': 'user_timeline',
+    'followers': 'get_followers',
+    'followings': 'get_followings',
+    'list_members': 'get_list_members'
+}
+
+filename_regex = re.compile(r'[^\w.-]')
+
+
+class Job:
+    __slots__ = ('id', 'type', 'kwargs', 'limit', 'output', 'items', 'error', 'started_at',
+                 'finished_at')
+
+    def __init__(self, job_id, job_type, kwargs, limit=None, output=None):
+        if job_type not in JOB_TYPES:
+            raise ValueError(f'unknown job type {job_type!r}, expected one of '
+                             f'{", ".join(JOB_TYPES)}')
+        self.id = job_id
+        self.type = job_type
+        self.kwargs = kwargs
+        self.limit = limit
+        self.output = output
+        self.items = 0
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+
+    @staticmethod
+    def from_dict(spec, default_id):
+        # Every key but id, type, limit and output is an argument of the BlueBird method
+        kwargs = dict(spec)
+        job_id = str(kwargs.pop('id', default_id))
+        if 'type' not in kwargs:
+            raise ValueError('missing job type')
+        job_type = kwargs.pop('type')
+        limit = kwargs.pop('limit', None)
+        output = kwargs.pop('output', None)
+        return Job(job_id, job_type, kwargs, limit, output)
+
+    def run(self, bluebird):
+        items = getattr(bluebird, JOB_TYPES[self.type])(**self.kwargs)
+        if self.limit is not None:
+            items = islice(items, self.limit)
+        return items
+
+
+def load_jobs(lines):
+    jobs = []
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if line and not line.startswith('#'):
+            try:
+                jobs.append(Job.from_dict(json.loads(line), number))
+            except ValueError as e:
+                raise ValueError(f'invalid job at line {number}: {e}')
+    return jobs
+
+
+class JobRunner:
+    """
+    Runs many jobs (searches, user timelines, followers...) in `workers`
+    threads sharing the same client, so they share its guest tokens and
+    connections. Results are streamed to one JSONL file per job in
+    `output_dir`, or to a single `output` file where every line is tagged
+    with its job ID. Progress is reported every `progress_interval` seconds.
+    """
+
+    def __init__(self,
+                 bluebird=None,
+                 workers=4,
+                 output=None,
+                 output_dir=None,
+                 compresslevel=0,
+                 progress_interval=10,
+                 progress_file=sys.stderr):
+        if (output is None) == (output_dir is None):
+            raise ValueError('either output or output_dir must be set')
+        if bluebird is None:
+            bluebird = BlueBird(guest_tokens=workers)
+        self.bluebird = bluebird
+        self.workers = workers
+        self.output = output
+        self.output_dir = output_dir
+        self.compresslevel = compresslevel
+        self.progress_interval = progress_interval
+        self.progress_file = progress_file
+
+        self.jobs = []
+        self._sink = None
+        self._sink_lock = Lock()
+        self._stop = Event()
+        self._started_at = None
+
+    def _get_path(self, job):
+        if job.output is not None:
+            return job.output
+        extension = '.jsonl.gz' if self.compresslevel else '.jsonl'
+        return os.path.join(self.output_dir, filename_regex.sub('_', job.id) + extension)
+
+    def _run_job(self, job):
+        if self._stop.is_set():
+            return
+        job.started_at = time.time()
+        try:
+            items = job.run(self.bluebird)
+            if self._sink is None:
+                self._write_job(job, items)
+            else:
+                self._write_merged(job, items)
+        except Exception as e:
+            job.error = e
+            logger.warning('job %s failed: %r', job.id, e)
+        job.finished_at = time.time()
+
+    def _write_job(self, job, items):
+        with JSONLSink(self._get_path(job), compresslevel=self.compresslevel) as sink:
+            for item in items:
+                sink.write(item)
+                job.items += 1
+                if self._stop.is_set():
+                    break
+
+    def _write_merged(self, job, items):
+        # Items are tagged and grouped before taking the lock of the shared file
+        batch = []
+        for item in items:
+            batch.append({'job': job.id, 'item': _to_dict(item)})
+            job.items += 1
+            if len(batch) >= 1000:
+                self._flush(batch)
+                batch = []
+            if self._stop.is_set():
+                break
+        self._flush(batch)
+
+    def _flush(self, batch):
+        with self._sink_lock:
+            for item in batch:
+                self._sink.write(item)
+
+    def get_stats(self):
+        now = time.time()
+        seconds = now - self._started_at if self._started_at is not None else 0
+        items = sum(job.items for job in self.jobs)
+        return {
+            'jobs': len(self.jobs),
+            'running': sum(1 for job in self.jobs
+                           if job.started_at is not None and job.finished_at is None),
+            'finished': sum(1 for job in self.jobs if job.finished_at is not None),
+            'failed': sum(1 for job in self.jobs if job.error is not None),
+            'items': items,
+            'seconds': seconds,
+            'items_per_second': items / seconds if seconds else 0.0
+        }
+
+    def _report(self, stats, last_items, last_time):
+        now = time.time()
+        rate = (stats['items'] - last_items) / (now - last_time) if now > last_time else 0.0
+        print(f'[{stats["seconds"]:8.1f}s] jobs {stats["finished"]}/{stats["jobs"]} '
+              f'({stats["running"]} running, {stats["failed"]} failed), '
+              f'{stats["items"]} items, {stats["items_per_second"]:.1f} items/s '
+              f'({rate:.1f} items/s now)',
+              file=self.progress_file,
+              flush=True)
+
+    def _report_progress(self, done):
+        last_items, last_time = 0, time.time()
+        while not done.wait(self.progress_interval):
+            stats = self.get_stats()
+            self._report(stats, last_items, last_time)
+            last_items, last_time = stats['items'], time.time()
+
+    def run(self, jobs):
+        self.jobs = list(jobs)
+        if self.output_dir is not None:
+            os.makedirs(self.output_dir, exist_ok=True)
+        else:
+            self._sink = JSONLSink(self.output, compresslevel=self.compresslevel)
+
+        self._started_at = time.time()
+        done = Event()
+        reporter = None
+        if self.progress_interval:
+            reporter = Thread(target=self._report_progress, args=(done, ), daemon=True)
+            reporter.start()
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                try:
+                    for future in [executor.submit(self._run_job, job) for job in self.jobs]:
+                        future.result()
+                except KeyboardInterrupt:
+                    # Running jobs stop at their next item, pending ones are skipped
+                    self._stop.set()
+                    raise
+        finally:
+            done.set()
+            if reporter is not None:
+                reporter.join()
+            if self._sink is not None:
+                self._sink.close()
+            if self.progress_interval:
+                self._report(self.get_stats(), 0, self._started_at)
+        return self.get_stats()
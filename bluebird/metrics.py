@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from functools import wraps
+from threading import Lock
+from time import perf_counter
+import time
+
+# Every instrumented spot checks this list first, so with no hooks installed
+# the cost is a truthiness test
+hooks = []
+
+METRICS = {
+    'request_seconds': ('summary', 'HTTP request latency'),
+    'response_bytes': ('counter', 'Response body bytes received'),
+    'parse_seconds': ('summary', 'JSON and HTML parse time'),
+    'guest_token_acquisitions': ('counter', 'Guest tokens handed out for a request'),
+    'guest_token_rotations': ('counter', 'Guest tokens retired and replaced'),
+    'retries': ('counter', 'Failed attempts that were retried'),
+    'give_ups': ('counter', 'Calls that failed after the last attempt'),
+    'tweets': ('counter', 'Tweets yielded'),
+}
+
+
+def add_hook(hook):
+    """
+    Installs a `hook(name, value, labels)` callback, called synchronously
+    from the crawling thread for every observation.
+    """
+    if hook not in hooks:
+        hooks.append(hook)
+
+
+def remove_hook(hook):
+    if hook in hooks:
+        hooks.remove(hook)
+
+
+def emit(name, value=1, **labels):
+    if hooks:
+        for hook in hooks:
+            hook(name, value, labels)
+
+
+def start():
+    if hooks:
+        return perf_counter()
+
+
+def observe(name, started, **labels):
+    if started is not None:
+        emit(name, perf_counter() - started, **labels)
+
+
+def timed(name, **labels):
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not hooks:
+                return function(*args, **kwargs)
+            started = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                emit(name, perf_counter() - started, **labels)
+
+        return wrapper
+
+    return decorator
+
+
+def count_items(items, name='tweets', **labels):
+    # Decided once per generator, uninstrumented generators are returned as is
+    if not hooks:
+        return items
+    return _count_items(items, name, labels)
+
+
+def _count_items(items, name, labels):
+    for item in items:
+        emit(name, 1, **labels)
+        yield item
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    values = ','.join(
+        '{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+        for key, value in labels)
+    return f'{{{values}}}'
+
+
+class MetricsCollector:
+    """
+    Aggregates the observations of the instrumentation hooks into counters
+    and summaries (count and sum), and exports them as a Prometheus text
+    snapshot. Counters also get a per-second rate since their first value.
+    """
+
+    def __init__(self, prefix='bluebird'):
+        self.prefix = prefix
+        self._values = dict()
+        self._lock = Lock()
+
+    def __call__(self, name, value, labels):
+        key = (name, tuple(sorted(labels.items())))
+        now = time.time()
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                self._values[key] = [1, value, now, now]
+            else:
+                entry[0] += 1
+                entry[1] += value
+                entry[3] = now
+
+    def __enter__(self):
+        return self.enable()
+
+    def __exit__(self, *args):
+        self.disable()
+
+    def enable(self):
+        add_hook(self)
+        return self
+
+    def disable(self):
+        remove_hook(self)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def snapshot(self):
+        snapshot = dict()
+        with self._lock:
+            for (name, labels), (count, total, first, last) in self._values.items():
+                values = {'count': count, 'sum': total}
+                if last > first:
+                    values['rate'] = total / (last - first)
+                snapshot.setdefault(name, dict())[labels] = values
+        return snapshot
+
+    def to_prometheus(self):
+        lines = []
+        for name, series in sorted(self.snapshot().items()):
+            metric_type, description = METRICS.get(name, ('untyped', name))
+            metric_name = f'{self.prefix}_{name}'
+            if metric_type == 'counter':
+                lines.append(f'# HELP {metric_name}_total {description}')
+                lines.append(f'# TYPE {metric_name}_total counter')
+            else:
+                lines.append(f'# HELP {metric_name} {description}')
+                lines.append(f'# TYPE {metric_name} {metric_type}')
+
+            for labels, values in sorted(series.items()):
+                formatted_labels = _format_labels(labels)
+                if metric_type == 'counter':
+                    lines.append(f'{metric_name}_total{formatted_labels} {values["sum"]}')
+                else:
+                    lines.append(f'{metric_name}_count{formatted_labels} {values["count"]}')
+                    lines.append(f'{metric_name}_sum{formatted_labels} {values["sum"]}')
+
+            rates = [(labels, values['rate']) for labels, values in sorted(series.items())
+                     if metric_type == 'counter' and 'rate' in values]
+            if rates:
+                lines.append(f'# TYPE {metric_name}_per_second gauge')
+                for labels, rate in rates:
+                    lines.append(f'{metric_name}_per_second{_format_labels(labels)} {rate}')
+        return '\n'.join(lines) + '\n'
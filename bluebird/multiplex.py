@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from .scraper import BlueBird
+from .streaming import StreamPoller
+from .query import encode_text
+from unicodedata import normalize, combining
+import time
+import re
+
+word_regex = re.compile(r'\w+')
+hashtag_regex = re.compile(r'#(\w+)')
+mention_regex = re.compile(r'@(\w+)')
+
+# Options that must be equal for two queries to share a request
+GLOBAL_OPTIONS = ('lang', 'near', 'since', 'until', 'since_id', 'max_id')
+
+
+def _normalize_text(text):
+    # Twitter search is case and accent insensitive
+    text = normalize('NFKD', text.lower())
+    return ''.join(character for character in text if not combining(character))
+
+
+class QueryMatcher:
+    """
+    Local approximation of the search semantics of a query, used to tell which
+    of the queries packed in the same request a tweet belongs to.
+    """
+
+    def __init__(self, query, user_ids=None):
+        self.fields = []
+        self.user_ids = user_ids or dict()
+        for field in query.get('fields', ()):
+            items = field['items']
+            target = field.get('target')
+            exact = field.get('exact', False)
+            match = field.get('match')
+
+            if exact:
+                target = None
+                terms = [_normalize_text(item) for item in items]
+            elif target in ('from', 'to', 'hashtag', 'mention'):
+                terms = [item.lower().lstrip('#@') for item in items]
+            else:
+                terms = [_normalize_text(word) for item in items for word in item.split()]
+
+            self.fields.append((target, exact, match, set(terms)))
+
+    @staticmethod
+    def get_tweet_features(tweet):
+        text = tweet.get('full_text') or tweet.get('text') or ''
+        normalized_text = _normalize_text(text)
+
+        authors = set()
+        user = tweet.get('user')
+        if isinstance(user, dict):
+            for key in ('screen_name', 'id', 'id_str'):
+                if user.get(key) is not None:
+                    authors.add(str(user[key]).lower())
+        if tweet.get('user_id_str'):
+            authors.add(tweet['user_id_str'])
+
+        return {
+            'text': normalized_text,
+            'words': set(word_regex.findall(normalized_text)),
+            'hashtags': set(hashtag.lower() for hashtag in hashtag_regex.findall(text)),
+            'mentions': set(mention.lower() for mention in mention_regex.findall(text)),
+            'authors': authors,
+            'replies': {(tweet.get('in_reply_to_screen_name') or '').lower()}
+        }
+
+    def matches(self, features):
+        for target, exact, match, terms in self.fields:
+            if exact:
+                found = {term for term in terms if term in features['text']}
+            elif target == 'from':
+                found = {
+                    term
+                    for term in terms if term in features['authors']
+                    or str(self.user_ids.get(term)) in features['authors']
+                }
+            elif target == 'to':
+                found = terms & features['replies']
+            elif target == 'hashtag':
+                found = terms & features['hashtags']
+            elif target == 'mention':
+                found = terms & features['mentions']
+            else:
+                found = terms & features['words']
+
+            if match == 'any':
+                if not found:
+                    return False
+            elif match == 'none':
+                if found:
+                    return False
+            elif found != terms:
+                return False
+        return True
+
+
+class StreamMultiplexer:
+    """
+    Streams many queries with few requests. Queries sharing the same global
+    options are packed into combined OR queries up to `max_query_length`
+    characters, polled on a shared schedule, and every tweet is yielded as
+    a `(query_ids, tweet)` pair with the IDs of the queries it matches.
+    Tweets that none of the packed queries matches locally (e.g., the terms
+    appear in an expanded URL) are yielded with no query IDs.
+    """
+
+    def __init__(self,
+                 bluebird,
+                 queries,
+                 mode=BlueBird.API_2,
+                 max_query_length=500,
+                 sleep_time=0,
+                 max_sleep_time=60,
+                 on_error=None):
+        if not isinstance(queries, dict):
+            queries = dict(enumerate(queries))
+
+        self.bluebird = bluebird
+        self.queries = queries
+        self.mode = mode
+        self.max_query_length = max_query_length
+
+        user_ids = self._resolve_authors(queries)
+        self.matchers = {
+            query_id: QueryMatcher(query, user_ids)
+            for query_id, query in queries.items()
+        }
+
+        self.packs = self.pack(queries, max_query_length)
+        self.pollers = [
+            StreamPoller(bluebird,
+                         packed_query,
+                         mode,
+                         min_interval=sleep_time,
+                         max_interval=max(sleep_time, max_sleep_time),
+                         on_error=on_error) for packed_query, _ in self.packs
+        ]
+
+    def _resolve_authors(self, queries):
+        # API v2 tweets only carry the author ID
+        if self.mode != BlueBird.API_2 or not hasattr(self.bluebird, 'get_user_ids'):
+            return dict()
+        usernames = {
+            item
+            for query in queries.values() for field in query.get('fields', ())
+            if field.get('target') == 'from' and not field.get('exact') for item in field['items']
+        }
+        if not usernames:
+            return dict()
+        user_ids = self.bluebird.get_user_ids(sorted(usernames))
+        return {username.lower(): user_id for username, user_id in user_ids.items()}
+
+    @staticmethod
+    def pack(queries, max_query_length=500):
+        groups = dict()
+        for query_id, query in queries.items():
+            options = tuple(repr(query.get(option)) for option in GLOBAL_OPTIONS)
+            groups.setdefault(options, []).append(query_id)
+
+        packs = []
+        for query_ids in groups.values():
+            template = queries[query_ids[0]]
+            expressions = []
+            packed_ids = []
+            for query_id in query_ids:
+                text = BlueBird._encode_fields(queries[query_id].get('fields', ())).strip()
+                if not text:
+                    # A query without fields matches every tweet, OR-ing it would too
+                    packs.append((StreamMultiplexer._build_query(template, []), [query_id]))
+                    continue
+                expression = f'({text})'
+                # The global options count towards the length of the packed query
+                packed_query = StreamMultiplexer._build_query(template, expressions + [expression])
+                if expressions and len(encode_text(packed_query)) > max_query_length:
+                    packs.append((StreamMultiplexer._build_query(template, expressions),
+                                  packed_ids))
+                    expressions = []
+                    packed_ids = []
+                expressions.append(expression)
+                packed_ids.append(query_id)
+            if packed_ids:
+                packs.append((StreamMultiplexer._build_query(template, expressions), packed_ids))
+        return packs
+
+    @staticmethod
+    def _build_query(template, expressions):
+        query = {option: template[option] for option in GLOBAL_OPTIONS if option in template}
+        if expressions:
+            query['raw'] = ' OR '.join(expressions)
+        return query
+
+    def match(self, tweet, query_ids):
+        features = QueryMatcher.get_tweet_features(tweet)
+        return [query_id for query_id in query_ids if self.matchers[query_id].matches(features)]
+
+    def __iter__(self):
+        next_polls = [0] * len(self.pollers)
+        while True:
+            now = time.time()
+            for index, poller in enumerate(self.pollers):
+                if next_polls[index] > now:
+                    continue
+
+                query_ids = self.packs[index][1]
+                started = time.time()
+                try:
+                    for tweet in poller.poll():
+                        yield self.match(tweet, query_ids), tweet
+                except Exception as e:
+                    poller._handle_error(e)
+                next_polls[index] = started + poller.get_interval()
+
+            wait_time = min(next_polls) - time.time()
+            if wait_time > 0:
+                time.sleep(wait_time)
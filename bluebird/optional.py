@@ -0,0 +1,14 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from functools import lru_cache
+from importlib import import_module
+
+
+@lru_cache(maxsize=None)
+def import_optional(name):
+    # Optional backends are only imported by the features that use them, None if missing
+    try:
+        return import_module(name)
+    except ImportError:
+        return None
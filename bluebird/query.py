@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from .cache import LRUCache
+from itertools import product
+from urllib.parse import quote
+
+TARGET_PREFIXES = {'from': 'from:', 'to': 'to:', 'hashtag': '#', 'mention': '@'}
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _encode_items(items, target, exact):
+    if exact:
+        return '"' + '" "'.join(items) + '"'
+    prefix = TARGET_PREFIXES.get(target)
+    if prefix is None:
+        return ' '.join(items)
+    return prefix + f' {prefix}'.join(items)
+
+
+def encode_field(field):
+    text = _encode_items(field['items'], field.get('target'), field.get('exact', False))
+    match = field.get('match')
+    if match == 'any':
+        return '(' + ' OR '.join(text.split()) + ')'
+    if match == 'none':
+        return '-' + ' -'.join(text.split())
+    return text
+
+
+def encode_text(query):
+    parts = []
+    if 'raw' in query:
+        parts.append(query['raw'])
+    parts.extend(encode_field(field) for field in query.get('fields', ()))
+
+    if 'since' in query:
+        parts.append(f'since:{query["since"]}')
+    if 'until' in query:
+        parts.append(f'until:{query["until"]}')
+    if 'since_id' in query:
+        parts.append(f'since_id:{query["since_id"]}')
+    if 'max_id' in query:
+        parts.append(f'max_id:{query["max_id"]}')
+    if 'near' in query:
+        near = query['near']
+        parts.append(f'near:"{near[0]}" within:{near[1]}mi')
+    return ' '.join(parts).strip()
+
+
+class QueryCompiler:
+    """
+    Compiles query dictionaries into URL-encoded search queries, memoizing
+    the last `cache_size` of them. Queries whose text goes over
+    `max_length` characters can be split into sub-queries by breaking
+    their `match: 'any'` item lists into smaller ones; the union of the
+    sub-queries matches the same tweets as the original query. A ValueError
+    is raised when that takes more than `max_queries` sub-queries.
+    """
+
+    def __init__(self, cache_size=10000, max_length=500, max_queries=64):
+        self.max_length = max_length
+        self.max_queries = max_queries
+        self.cache = LRUCache(cache_size)
+
+    def compile(self, query):
+        key = _freeze(query)
+        encoded_query = self.cache.get(key)
+        if encoded_query is None:
+            encoded_query = quote(encode_text(query))
+            if 'lang' in query:
+                encoded_query += f'&l={query["lang"]}'
+            self.cache.set(key, encoded_query)
+        return encoded_query
+
+    def split(self, query, max_length=None):
+        if max_length is None:
+            max_length = self.max_length
+        if len(encode_text(query)) <= max_length:
+            return [query]
+
+        fields = query.get('fields', [])
+        splittable = [
+            index for index, field in enumerate(fields)
+            if field.get('match') == 'any' and len(field['items']) > 1
+        ]
+        if not splittable:
+            return [query]
+
+        # Splitting the largest fields and keeping the rest whole often takes fewer
+        # combinations than splitting all of them, the split with the fewest wins
+        lengths = {index: len(encode_field(fields[index])) - len('()') for index in splittable}
+        splittable.sort(key=lengths.get, reverse=True)
+        best = None
+        for count in range(1, len(splittable) + 1):
+            budgets = QueryCompiler._share_budget(query, splittable[:count], lengths, max_length)
+            if budgets is None:
+                continue
+            indexes = sorted(budgets)
+            chunks = [
+                QueryCompiler._chunk_items(fields[index], budgets[index]) for index in indexes
+            ]
+            combinations = 1
+            for field_chunks in chunks:
+                combinations *= len(field_chunks)
+            if best is None or combinations < best[0]:
+                best = (combinations, indexes, chunks)
+        if best is None:
+            raise ValueError(f'the query is longer than {max_length} characters without '
+                             f'its splittable fields')
+
+        combinations, splittable, chunks = best
+        if combinations > self.max_queries:
+            raise ValueError(f'the query would be split into {combinations} sub-queries, '
+                             f'more than {self.max_queries}')
+
+        queries = []
+        for combination in product(*chunks):
+            sub_fields = list(fields)
+            for index, items in zip(splittable, combination):
+                sub_fields[index] = dict(fields[index], items=items)
+            queries.append(dict(query, fields=sub_fields))
+        return queries
+
+    @staticmethod
+    def _share_budget(query, split, lengths, max_length):
+        # The characters left by the rest of the query are shared evenly by the split
+        # fields, None if there are none left
+        fields = query['fields']
+        rest = dict(query,
+                    fields=[field for index, field in enumerate(fields) if index not in split])
+        available = max_length - len(encode_text(rest)) - len(' ()') * len(split)
+        if available <= 0:
+            return
+        budgets = dict()
+        for position, index in enumerate(sorted(split, key=lengths.get)):
+            budgets[index] = min(lengths[index], available // (len(split) - position))
+            available -= budgets[index]
+        return budgets
+
+    @staticmethod
+    def _chunk_items(field, budget):
+        chunks = [[]]
+        length = 0
+        for item in field['items']:
+            item_length = len(encode_field(dict(field, items=[item]))) - len('()')
+            if chunks[-1] and length + len(' OR ') + item_length > budget:
+                chunks.append([])
+                length = 0
+            elif chunks[-1]:
+                length += len(' OR ')
+            chunks[-1].append(item)
+            length += item_length
+        return chunks
+
+
+default_compiler = QueryCompiler()
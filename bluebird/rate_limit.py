@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from threading import Condition
+from urllib.parse import urlsplit
+from . import metrics
+import time
+import re
+
+# Numeric path segments (user IDs), API versions like /2/ or /1.1/ are kept
+id_regex = re.compile(r'/\d{3,}(?=[/.]|$)')
+
+
+class RateLimitBucket:
+    __slots__ = ('limit', 'remaining', 'reset')
+
+    def __init__(self):
+        self.limit = None
+        self.remaining = None
+        self.reset = None
+
+    def take(self, now):
+        if self.reset is not None and now >= self.reset:
+            self.remaining = self.limit
+            self.reset = None
+        # Unknown budgets are optimistic until the first response tells otherwise
+        if self.remaining is None:
+            return True
+        if self.remaining > 0:
+            self.remaining -= 1
+            return True
+        return False
+
+
+class RateLimitScheduler:
+    """
+    Tracks the x-rate-limit-* headers for every endpoint and guest token, and
+    hands out a token with budget left for the given endpoint. When every
+    token is exhausted the caller waits for the earliest reset instead of
+    hitting a 429. Waiting callers are served in arrival order, so concurrent
+    crawls share the budget fairly.
+    """
+
+    def __init__(self, margin=1):
+        self.margin = margin
+        self.waits = 0
+        self.rate_limited = 0
+
+        self._buckets = dict()
+        self._condition = Condition()
+        # Per-endpoint ticket queues, an exhausted endpoint doesn't hold back the rest
+        self._next_tickets = dict()
+        self._serving = dict()
+
+    @staticmethod
+    def get_endpoint(url):
+        path = urlsplit(url).path
+        return id_regex.sub('/:id', path)
+
+    def _get_bucket(self, endpoint, token):
+        key = (endpoint, token.value)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = RateLimitBucket()
+        return bucket
+
+    def acquire(self, endpoint, token_pool):
+        with self._condition:
+            ticket = self._next_tickets.get(endpoint, 0)
+            self._next_tickets[endpoint] = ticket + 1
+            while ticket != self._serving.get(endpoint, 0):
+                self._condition.wait()
+
+        try:
+            while True:
+                now = time.time()
+                earliest_reset = None
+                for _ in range(max(1, len(token_pool))):
+                    # The pool may block fetching a token, other endpoints go on meanwhile
+                    token = token_pool.acquire()
+                    with self._condition:
+                        bucket = self._get_bucket(endpoint, token)
+                        if bucket.take(now):
+                            metrics.emit('guest_token_acquisitions', endpoint=endpoint)
+                            return token
+                        if bucket.reset is not None and (earliest_reset is None
+                                                         or bucket.reset < earliest_reset):
+                            earliest_reset = bucket.reset
+                    token_pool.release(token)
+
+                with self._condition:
+                    self.waits += 1
+                    wait_time = self.margin
+                    if earliest_reset is not None:
+                        wait_time += max(earliest_reset - now, 0)
+                    self._condition.wait(wait_time)
+        finally:
+            with self._condition:
+                self._serving[endpoint] = ticket + 1
+                self._condition.notify_all()
+
+    def try_acquire(self, endpoint, token_pool):
+        # Non-blocking acquire, None if the caller would have to wait
+        with self._condition:
+            if self._next_tickets.get(endpoint, 0) != self._serving.get(endpoint, 0):
+                return
+            now = time.time()
+            for _ in range(max(1, len(token_pool))):
+                token = token_pool.acquire(block=False)
+                if token is None:
+                    return
+                if self._get_bucket(endpoint, token).take(now):
+                    metrics.emit('guest_token_acquisitions', endpoint=endpoint)
+                    return token
+                token_pool.release(token)
+
+    def update(self, endpoint, token, headers, status=None):
+        limit = headers.get('x-rate-limit-limit')
+        remaining = headers.get('x-rate-limit-remaining')
+        reset = headers.get('x-rate-limit-reset')
+
+        with self._condition:
+            bucket = self._get_bucket(endpoint, token)
+            if limit is not None:
+                bucket.limit = int(limit)
+            if remaining is not None:
+                bucket.remaining = int(remaining)
+            if reset is not None:
+                bucket.reset = int(reset)
+
+            if status == 429:
+                self.rate_limited += 1
+                bucket.remaining = 0
+                if bucket.reset is None:
+                    bucket.reset = time.time() + 60
+            self._condition.notify_all()
+
+    def exhaust(self, endpoint, token):
+        self.update(endpoint, token, {}, status=429)
+
+    def get_budget(self, endpoint):
+        # Calls left for the endpoint across every token, None until the headers tell
+        with self._condition:
+            now = time.time()
+            budget = None
+            for (bucket_endpoint, _), bucket in self._buckets.items():
+                if bucket_endpoint != endpoint or bucket.remaining is None:
+                    continue
+                if bucket.reset is not None and now >= bucket.reset:
+                    budget = (budget or 0) + (bucket.limit or 0)
+                else:
+                    budget = (budget or 0) + bucket.remaining
+            return budget
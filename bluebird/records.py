@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from datetime import datetime
+
+
+def _parse_created_at(value):
+    # 'Sun Oct 18 10:00:00 +0000 2020' -> epoch milliseconds
+    if value is None:
+        return
+    return int(datetime.strptime(value, '%a %b %d %H:%M:%S %z %Y').timestamp() * 1000)
+
+
+def _get_text(tweet):
+    text = tweet.get('full_text')
+    if text is None:
+        text = tweet.get('text')
+    return text
+
+
+# Extractors of the full projection, by record class and extractor table
+_default_extractors = dict()
+
+
+class Record:
+    __slots__ = ()
+
+    FIELDS = ()
+
+    def __init__(self, **values):
+        for name, value in values.items():
+            setattr(self, name, value)
+
+    def __getattr__(self, name):
+        # Fields left out of the projection read as None
+        if name in self.FIELDS:
+            return
+        raise AttributeError(name)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        values = ', '.join(f'{name}={value!r}' for name, value in self.to_dict().items())
+        return f'{type(self).__name__}({values})'
+
+    def to_dict(self):
+        values = dict()
+        for name in self.FIELDS:
+            try:
+                value = object.__getattribute__(self, name)
+            except AttributeError:
+                continue
+            if isinstance(value, Record):
+                value = value.to_dict()
+            values[name] = value
+        return values
+
+    @classmethod
+    def _get_fields(cls, fields):
+        if fields is None:
+            return cls.FIELDS
+        unknown = set(fields).difference(cls.FIELDS)
+        if unknown:
+            raise ValueError(f'unknown {cls.__name__} fields: {", ".join(sorted(unknown))}')
+        return fields
+
+    @classmethod
+    def _get_extractors(cls, extractors, fields):
+        # Resolved once per projection, then shared by every record built with it
+        if fields is None:
+            key = (cls, id(extractors))
+            resolved = _default_extractors.get(key)
+            if resolved is None:
+                resolved = _default_extractors[key] = cls._get_extractors(extractors, cls.FIELDS)
+            return resolved
+        return tuple((name, extractors[name]) for name in cls._get_fields(fields)
+                     if name in extractors)
+
+    @classmethod
+    def _build(cls, extractors, data):
+        record = cls.__new__(cls)
+        for name, extractor in extractors:
+            setattr(record, name, extractor(data))
+        return record
+
+
+class User(Record):
+    __slots__ = ('id', 'screen_name', 'name', 'description', 'location', 'followers_count',
+                 'friends_count', 'statuses_count', 'created_at', 'verified')
+
+    FIELDS = __slots__
+
+    _EXTRACTORS_WEB = {
+        'id': lambda user: user.get('id'),
+        'screen_name': lambda user: user.get('screen_name'),
+        'name': lambda user: user.get('name'),
+    }
+
+    _EXTRACTORS_API = {
+        'id': lambda user: user.get('id_str') or (str(user['id']) if 'id' in user else None),
+        'screen_name': lambda user: user.get('screen_name'),
+        'name': lambda user: user.get('name'),
+        'description': lambda user: user.get('description'),
+        'location': lambda user: user.get('location'),
+        'followers_count': lambda user: user.get('followers_count'),
+        'friends_count': lambda user: user.get('friends_count'),
+        'statuses_count': lambda user: user.get('statuses_count'),
+        'created_at': lambda user: _parse_created_at(user.get('created_at')),
+        'verified': lambda user: user.get('verified'),
+    }
+
+    @classmethod
+    def from_web(cls, user, fields=None):
+        return cls._build(cls._get_extractors(cls._EXTRACTORS_WEB, fields), user)
+
+    @classmethod
+    def from_api(cls, user, fields=None):
+        return cls._build(cls._get_extractors(cls._EXTRACTORS_API, fields), user)
+
+
+class Tweet(Record):
+    __slots__ = ('id', 'created_at', 'text', 'language', 'user', 'url', 'retweet_count',
+                 'favorite_count', 'reply_count', 'in_reply_to_status_id')
+
+    FIELDS = __slots__
+
+    _EXTRACTORS_WEB = {
+        'id': lambda tweet: tweet['id'],
+        'created_at': lambda tweet: int(tweet['timestamp']),
+        'text': lambda tweet: tweet['text'],
+        'language': lambda tweet: tweet['language'],
+        'user': lambda tweet: User.from_web(tweet['user']),
+        'url': lambda tweet: tweet['url'],
+    }
+
+    _EXTRACTORS_1_1 = {
+        'id': lambda tweet: tweet.get('id_str') or str(tweet['id']),
+        'created_at': lambda tweet: _parse_created_at(tweet.get('created_at')),
+        'text': _get_text,
+        'language': lambda tweet: tweet.get('lang'),
+        'user': lambda tweet: User.from_api(tweet['user']) if 'user' in tweet else None,
+        'url': lambda tweet: f"https://twitter.com/i/web/status/{tweet.get('id_str') or tweet['id']}",
+        'retweet_count': lambda tweet: tweet.get('retweet_count'),
+        'favorite_count': lambda tweet: tweet.get('favorite_count'),
+        'reply_count': lambda tweet: tweet.get('reply_count'),
+        'in_reply_to_status_id': lambda tweet: tweet.get('in_reply_to_status_id_str'),
+    }
+
+    _EXTRACTORS_2 = dict(_EXTRACTORS_1_1)
+    _EXTRACTORS_2.update({
+        'id': lambda tweet: str(tweet['id']),
+        'user': lambda tweet: User(id=tweet['user_id_str']) if 'user_id_str' in tweet else None,
+        'url': lambda tweet: f"https://twitter.com/i/web/status/{tweet['id']}",
+    })
+
+    @classmethod
+    def from_web(cls, tweet, fields=None):
+        return cls._build(cls._get_extractors(cls._EXTRACTORS_WEB, fields), tweet)
+
+    @classmethod
+    def from_1_1(cls, tweet, fields=None):
+        return cls._build(cls._get_extractors(cls._EXTRACTORS_1_1, fields), tweet)
+
+    @classmethod
+    def from_2(cls, tweet, fields=None):
+        return cls._build(cls._get_extractors(cls._EXTRACTORS_2, fields), tweet)
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from threading import Lock
+from . import metrics
+import asyncio
+import random
+import time
+
+
+class RetryableError(Exception):
+    pass
+
+
+class RetryError(Exception):
+    def __init__(self, endpoint, attempts, exception=None):
+        super(RetryError, self).__init__(
+            f'{endpoint} failed after {attempts} attempts: {exception!r}')
+        self.endpoint = endpoint
+        self.attempts = attempts
+        self.exception = exception
+
+
+class CircuitOpenError(RetryError):
+    def __init__(self, endpoint, retry_at):
+        Exception.__init__(self, f'{endpoint} circuit is open until {retry_at:.0f}')
+        self.endpoint = endpoint
+        self.attempts = 0
+        self.exception = None
+        self.retry_at = retry_at
+
+
+class CircuitBreaker:
+    __slots__ = ('failures', 'opened_at', 'probing')
+
+    def __init__(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+
+class RetryPolicy:
+    """
+    Retries a failing call up to `max_attempts` times, sleeping an exponential
+    backoff with jitter between attempts. Every endpoint has a circuit breaker
+    that opens after `failure_threshold` consecutive failures: calls to it fail
+    fast with a CircuitOpenError until `reset_timeout` seconds later, when a
+    single probe call decides whether it closes again.
+    """
+
+    def __init__(self,
+                 max_attempts=5,
+                 backoff=0.5,
+                 max_backoff=30,
+                 failure_threshold=10,
+                 reset_timeout=60,
+                 retry_on=(Exception,)):
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.retry_on = retry_on
+
+        self.retries = 0
+        self.give_ups = 0
+        self.rejections = 0
+
+        self._breakers = dict()
+        self._lock = Lock()
+
+    def get_delay(self, attempt):
+        delay = min(self.backoff * 2**(attempt - 1), self.max_backoff)
+        # Half fixed, half random: spreads out retries without ever busy-looping
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def _before_attempt(self, endpoint):
+        with self._lock:
+            breaker = self._breakers.get(endpoint)
+            if breaker is None:
+                breaker = self._breakers[endpoint] = CircuitBreaker()
+            if breaker.opened_at is None:
+                return
+            retry_at = breaker.opened_at + self.reset_timeout
+            if breaker.probing or time.time() < retry_at:
+                self.rejections += 1
+                raise CircuitOpenError(endpoint, retry_at)
+            breaker.probing = True
+
+    def _on_success(self, endpoint):
+        with self._lock:
+            breaker = self._breakers[endpoint]
+            breaker.failures = 0
+            breaker.opened_at = None
+            breaker.probing = False
+
+    def _on_failure(self, endpoint, attempt, exception):
+        with self._lock:
+            breaker = self._breakers[endpoint]
+            breaker.failures += 1
+            if breaker.probing or breaker.failures >= self.failure_threshold:
+                breaker.opened_at = time.time()
+            breaker.probing = False
+
+            give_up = attempt >= self.max_attempts or breaker.opened_at is not None
+            if give_up:
+                self.give_ups += 1
+            else:
+                self.retries += 1
+
+        if give_up:
+            metrics.emit('give_ups', endpoint=endpoint)
+            raise RetryError(endpoint, attempt, exception) from exception
+        metrics.emit('retries', endpoint=endpoint)
+        return self.get_delay(attempt)
+
+    def call(self, endpoint, function, *args, **kwargs):
+        attempt = 0
+        while True:
+            attempt += 1
+            self._before_attempt(endpoint)
+            try:
+                result = function(*args, **kwargs)
+            except self.retry_on as e:
+                time.sleep(self._on_failure(endpoint, attempt, e))
+            else:
+                self._on_success(endpoint)
+                return result
+
+    async def call_async(self, endpoint, function, *args, **kwargs):
+        attempt = 0
+        while True:
+            attempt += 1
+            self._before_attempt(endpoint)
+            try:
+                result = await function(*args, **kwargs)
+            except self.retry_on as e:
+                await asyncio.sleep(self._on_failure(endpoint, attempt, e))
+            else:
+                self._on_success(endpoint)
+                return result
+
+    def stats(self):
+        with self._lock:
+            open_circuits = [
+                endpoint for endpoint, breaker in self._breakers.items()
+                if breaker.opened_at is not None
+            ]
+        return {
+            'retries': self.retries,
+            'give_ups': self.give_ups,
+            'rejections': self.rejections,
+            'open_circuits': open_circuits
+        }
@@ -1,30 +1,58 @@
-# TODO
-# urrlib <-> requests
-
-import requests
 from .http_helper import TwitterHttpHelper as HttpHelper
-from urllib.parse import quote
-from orderedset import OrderedSet
+from .token_pool import GuestTokenPool
+from .transport import get_default_transport
+from .decoding import get_default_decoder
+from .sharding import split_query, merge_generators
+from .cache import LRUCache
+from .checkpoint import get_checkpoint_key, DeferredCheckpointStore, CheckpointOperation, \
+    apply_checkpoint_operations
+from .text import extract_text, whitespace_regex
+from .records import Tweet
+from .streaming import StreamPoller
+from .dedup import SortedIdSet
+from .rate_limit import RateLimitScheduler
+from .query import default_compiler, encode_field
+from .retry import RetryPolicy, RetryableError
+from . import metrics
+from functools import partial, update_wrapper
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from threading import Lock
+from html import unescape
 from lxml.html import document_fromstring
-from lxml.etree import tostring, ParserError
 import time
 import re
 
 
-class CircularOrderedSet(OrderedSet):
+class CircularOrderedSet(OrderedDict):
     def __init__(self, size=0):
         super(CircularOrderedSet, self).__init__()
         self.size = size
 
     def add(self, value):
-        super(CircularOrderedSet, self).add(value)
+        self[value] = None
         self._truncate()
 
+    def pop(self, last=True):
+        return self.popitem(last=last)[0]
+
     def _truncate(self):
         if len(self) > self.size:
             self.pop(last=False)
 
 
+class _default_client_method:
+    # These methods used to be static: called on the class, they run on a shared default client
+    def __init__(self, function):
+        self.function = function
+        update_wrapper(self, function)
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            instance = owner._get_default_client()
+        return self.function.__get__(instance, owner)
+
+
 class BlueBird:
 
     API_WEB = 'web'
@@ -34,14 +62,89 @@ class BlueBird:
     emoji_flag = '24f2c44c'
     emoji_regex = re.compile(r'alt="(.{0,8})"')
     img_regex = re.compile(r'<img([\w\W]+?)/>')
+    followx_cursor_regex = re.compile(r'<div class="w-button-more">\s*<a href="([^"]*)"')
+
+    ERROR_FORBIDDEN = 'forbidden'
+    ERROR_FATAL = 'fatal'
+    ERROR_RETRY = 'retry'
+    ERROR_RATE_LIMITED = 'rate_limited'
 
     ACCESS_TOKEN = 'AAAAAAAAAAAAAAAAAAAAANRILgAAAAAAnNwIzUejRCOuH5E6I8xnZz4puTs%3D1Zv7ttfk8LF81IUq16cHjhLTvJu4FA33AGWWjCpTnA'
 
-    def __init__(self):
-        self.guest_tokens = list()
-        self._request_guest_token()
-        self.user_ids = dict()
-        self.user_names = dict()
+    USERS_LOOKUP_LIMIT = 100
+
+    _default_client = None
+    _default_client_lock = Lock()
+
+    def __init__(self,
+                 guest_tokens=1,
+                 token_pool=None,
+                 transport=None,
+                 user_cache_size=100000,
+                 user_cache_ttl=86400,
+                 json_decoder=None,
+                 rate_limits=None,
+                 retry_policy=None,
+                 parse_workers=None,
+                 max_query_length=500,
+                 query_workers=8,
+                 token_cache=None):
+        if transport is None:
+            transport = get_default_transport()
+        self.transport = transport
+        if json_decoder is None:
+            json_decoder = get_default_decoder()
+        self.json_decoder = json_decoder
+        if token_pool is None:
+            # Tokens are fetched on the first API request, or reused from token_cache
+            token_pool = GuestTokenPool(partial(BlueBird._get_guest_token, transport),
+                                        size=guest_tokens,
+                                        prewarm=False,
+                                        cache=token_cache)
+        self.guest_tokens = token_pool
+        if rate_limits is None:
+            rate_limits = RateLimitScheduler()
+        self.rate_limits = rate_limits
+        if retry_policy is None:
+            retry_policy = RetryPolicy()
+        self.retry_policy = retry_policy
+        self.user_ids = LRUCache(user_cache_size, user_cache_ttl)
+        self.user_names = LRUCache(user_cache_size, user_cache_ttl)
+        # With parse workers, HTML pages are parsed in a process pool while the next is fetched
+        self.parse_workers = parse_workers
+        self._parse_pool = None
+        self._parse_pool_lock = Lock()
+        # Searches longer than this are split into sub-queries run by up to query_workers threads
+        self.max_query_length = max_query_length
+        self.query_workers = query_workers
+
+    def close(self):
+        with self._parse_pool_lock:
+            if self._parse_pool is not None:
+                self._parse_pool.shutdown()
+                self._parse_pool = None
+
+    def _get_parse_pool(self):
+        with self._parse_pool_lock:
+            if self._parse_pool is None:
+                self._parse_pool = ProcessPoolExecutor(self.parse_workers)
+            return self._parse_pool
+
+    def _pipeline(self, pages, parse):
+        # Yields (state, future) pairs in order, fetching ahead while earlier pages are parsed
+        pool = self._get_parse_pool()
+        pending = deque()
+        try:
+            for data, state in pages:
+                pending.append((state, pool.submit(parse, data)))
+                while pending and (pending[0][1].done()
+                                   or len(pending) >= 2 * self.parse_workers):
+                    yield pending.popleft()
+            while pending:
+                yield pending.popleft()
+        finally:
+            for _, future in pending:
+                future.cancel()
 
     @staticmethod
     def get_emojis(text):
@@ -61,11 +164,12 @@ class BlueBird:
     @staticmethod
     def post_process_text(text):
         text = text.replace('…', '')
-        text = re.sub(r'\s+', ' ', text)
+        text = whitespace_regex.sub(' ', text)
         return text
 
     @staticmethod
     def get_processed_text(html_content):
+        # Public helper kept for callers, the crawls use extract_text (timed with their pages)
         emojis = BlueBird.get_emojis(html_content)
         tagged_html = BlueBird.get_tagged_html(html_content)
         tagged_text = document_fromstring(tagged_html).text_content()
@@ -81,54 +185,76 @@ class BlueBird:
         return headers
 
     @staticmethod
-    def _get_guest_token():
+    def _get_guest_token(transport=None):
+        if transport is None:
+            transport = get_default_transport()
         url = 'https://api.twitter.com/1.1/guest/activate.json'
         headers = BlueBird._get_auth_header()
-        response = requests.post(url, headers=headers)
+        response = transport.request('POST', url, headers=headers)
         return response.json()['guest_token']
 
-    def _get_first_guest_token(self):
-        return self.guest_tokens[0]
-
-    def _rotate_guest_token(self):
-        self.guest_tokens.append(self._pop_guest_token())
-
-    def _pop_guest_token(self):
-        return self.guest_tokens.pop(0)
-
-    def _request_guest_token(self):
-        guest_token = self._get_guest_token()
-        self.guest_tokens.append(guest_token)
-
-    def _get_api_response(self, url):
-        first_guest_token = None
-        valid_guest_token_found = False
-
-        data = None
-        while not valid_guest_token_found:
-            guest_token = self._get_first_guest_token()
-
-            if first_guest_token is None:
-                first_guest_token = guest_token
-            elif first_guest_token == guest_token:
-                self._request_guest_token()
-
-            headers = self._get_auth_header(guest_token=guest_token)
-            response = requests.get(url, headers=headers)
-
-            data = response.json()
-            if 'errors' in data:
-                error_message = data['errors'][0]['message']
-                if error_message == 'Forbidden.':
-                    self._pop_guest_token()
-                elif error_message == 'Bad request.' or error_message == "User not found.":
-                    return
-                else:
-                    self._rotate_guest_token()
-            else:
-                valid_guest_token_found = True
+    def _get_api_response(self, url, page_2=False):
+        endpoint = RateLimitScheduler.get_endpoint(url)
+        return self.retry_policy.call(endpoint, self._request_api, url, endpoint, page_2)
+
+    def _request_api(self, url, endpoint, page_2):
+        # Fresh cached responses don't spend a guest token or rate limit budget
+        guest_token = None
+        get_cached = getattr(self.transport, 'get_cached', None)
+        response = get_cached(url) if get_cached is not None else None
+        if response is None:
+            guest_token = self.rate_limits.acquire(endpoint, self.guest_tokens)
+
+            headers = self._get_auth_header(guest_token=guest_token.value)
+            started = metrics.start()
+            response = self.transport.request('GET', url, headers=headers)
+            metrics.observe('request_seconds', started, endpoint=endpoint, status=response.status)
+            metrics.emit('response_bytes', len(response.data), endpoint=endpoint)
+            self.rate_limits.update(endpoint, guest_token, response.headers, response.status)
+            if response.status == 429:
+                raise RetryableError(f'{endpoint} is rate limited')
+
+        started = metrics.start()
+        if page_2:
+            data = self.json_decoder.loads_page_2(response.data)
+        else:
+            data = self.json_decoder.loads(response.data)
+        metrics.observe('parse_seconds', started, format='json', endpoint=endpoint)
+        error = BlueBird._get_api_error(data)
+        if error == BlueBird.ERROR_FATAL:
+            return
+        elif error is None:
+            return data
+        elif guest_token is None:
+            pass
+        elif error == BlueBird.ERROR_RATE_LIMITED:
+            self.rate_limits.exhaust(endpoint, guest_token)
+        elif error == BlueBird.ERROR_FORBIDDEN:
+            self.guest_tokens.retire(guest_token)
+        # Transient errors keep the token, the retry takes the next one of the pool
+        raise RetryableError(f'{endpoint} answered {data["errors"][0]["message"]!r}')
 
-        return data
+    @staticmethod
+    def _get_api_error(data):
+        if 'errors' not in data:
+            return
+        error_message = data['errors'][0]['message']
+        if data['errors'][0].get('code') == 88 or error_message == 'Rate limit exceeded.':
+            return BlueBird.ERROR_RATE_LIMITED
+        if error_message == 'Forbidden.':
+            return BlueBird.ERROR_FORBIDDEN
+        if error_message in ('Bad request.', 'User not found.',
+                             'No user matches for specified terms.'):
+            return BlueBird.ERROR_FATAL
+        return BlueBird.ERROR_RETRY
+
+    @classmethod
+    def _get_default_client(cls):
+        if cls._default_client is None:
+            with cls._default_client_lock:
+                if cls._default_client is None:
+                    cls._default_client = cls()
+        return cls._default_client
 
     def get_user_by_name(self, username):
         url = f'https://api.twitter.com/1.1/users/show.json?screen_name={username}'
@@ -138,213 +264,304 @@ class BlueBird:
         url = f'https://api.twitter.com/1.1/users/show.json?id={user_id}'
         return self._get_api_response(url)
 
+    def _cache_user(self, user):
+        self.user_ids.set(user['screen_name'].lower(), user['id'])
+        self.user_names.set(str(user['id']), user['screen_name'])
+
+    def _lookup_users(self, key, values):
+        users = []
+        for i in range(0, len(values), BlueBird.USERS_LOOKUP_LIMIT):
+            batch = ','.join(str(value) for value in values[i:i + BlueBird.USERS_LOOKUP_LIMIT])
+            url = f'https://api.twitter.com/1.1/users/lookup.json?{key}={batch}'
+            response = self._get_api_response(url)
+            if response is None:
+                continue
+            for user in response:
+                self._cache_user(user)
+                users.append(user)
+        return users
+
+    def get_users_by_name(self, usernames):
+        return self._lookup_users('screen_name', list(usernames))
+
+    def get_users_by_id(self, user_ids):
+        return self._lookup_users('user_id', list(user_ids))
+
+    def get_user_ids(self, usernames):
+        user_ids = dict()
+        missing = list()
+        for username in usernames:
+            user_id = self.user_ids.get(username.lower())
+            if user_id is None:
+                missing.append(username)
+            else:
+                user_ids[username] = user_id
+
+        if missing:
+            self.get_users_by_name(missing)
+            for username in missing:
+                user_id = self.user_ids.get(username.lower(), count=False)
+                if user_id is not None:
+                    user_ids[username] = user_id
+        return user_ids
+
+    def get_screen_names(self, user_ids):
+        screen_names = dict()
+        missing = list()
+        for user_id in user_ids:
+            screen_name = self.user_names.get(str(user_id))
+            if screen_name is None:
+                missing.append(user_id)
+            else:
+                screen_names[user_id] = screen_name
+
+        if missing:
+            self.get_users_by_id(missing)
+            for user_id in missing:
+                screen_name = self.user_names.get(str(user_id), count=False)
+                if screen_name is not None:
+                    screen_names[user_id] = screen_name
+        return screen_names
+
     def get_user_id(self, username):
-        if username not in self.user_ids:
-            user_id = self.get_user_by_name(username)['id']
-            self.user_ids[username] = user_id
-        return self.user_ids[username]
+        user_id = self.user_ids.get(username.lower())
+        if user_id is None:
+            user = self.get_user_by_name(username)
+            self._cache_user(user)
+            user_id = user['id']
+        return user_id
 
     def get_screen_name(self, user_id):
-        if user_id not in self.user_names:
-            screen_name = self.get_user_by_id(user_id)['screen_name']
-            self.user_names[user_id] = screen_name
-        return self.user_names[user_id]
+        screen_name = self.user_names.get(str(user_id))
+        if screen_name is None:
+            user = self.get_user_by_id(user_id)
+            self._cache_user(user)
+            screen_name = user['screen_name']
+        return screen_name
 
     @staticmethod
     def _update_url_with_params(url, params):
-        first = True
-        for key, value in params.items():
-            symbol = '&'
-            if first:
-                symbol = '?'
-                first = False
-            url += f'{symbol}{key}={value}'
-        return url
+        if not params:
+            return url
+        return url + '?' + '&'.join(f'{key}={value}' for key, value in params.items())
 
     @staticmethod
-    def _encode_query(query) -> str:
-        encoded_query = ''
+    def _encode_fields(fields):
+        return ''.join(' ' + encode_field(field) for field in fields)
 
-        since = None
-        if 'since' in query:
-            since = query['since']
+    @staticmethod
+    def _encode_query(query) -> str:
+        return default_compiler.compile(query)
 
-        until = None
-        if 'until' in query:
-            until = query['until']
+    @staticmethod
+    def _load_checkpoint(checkpoint, url):
+        if checkpoint is None:
+            return dict()
+        state = checkpoint.load(get_checkpoint_key(url))
+        if state is None:
+            return dict()
+        return state
 
-        near = None
-        if 'near' in query:
-            near = query['near']
+    @staticmethod
+    def _below_target(seen_tweets, min_tweets):
+        # A callable target is shared by several crawls, e.g. the sub-queries of a split search
+        if callable(min_tweets):
+            return min_tweets()
+        return seen_tweets < min_tweets
 
-        lang = None
-        if 'lang' in query:
-            lang = query['lang']
+    @staticmethod
+    def _save_checkpoint(checkpoint, url, state, done):
+        if checkpoint is None:
+            return
+        if done:
+            checkpoint.delete(get_checkpoint_key(url))
+        else:
+            checkpoint.save(get_checkpoint_key(url), state)
 
-        fields = []
-        if 'fields' in query:
-            fields = query['fields']
+    def _get_tweets_web(self, url, deep, sleep_time, query_type, min_tweets, checkpoint=None):
+        if self.parse_workers:
+            yield from self._get_tweets_web_pipelined(url, deep, sleep_time, query_type,
+                                                      min_tweets, checkpoint)
+            return
 
-        for field in fields:
-            target = None
-            if 'target' in field:
-                target = field['target']
+        url = BlueBird._get_web_url(url)
 
-            items = field['items']
+        state = BlueBird._load_checkpoint(checkpoint, url)
+        seen_tweets = state.get('seen_tweets', 0)
+        position = state.get('position', BlueBird._get_initial_position_web(query_type))
 
-            match = None
-            if 'match' in field:
-                match = field['match']
+        has_more_items = True
+        while has_more_items:
+            new_url = f'{url}{position}&reset_error_state=false'
+            endpoint = f'web/{query_type}'
+            content, tweets = self.retry_policy.call(endpoint, self._get_tweets_page_web, new_url,
+                                                     endpoint)
 
-            exact = False
-            if 'exact' in field:
-                exact = field['exact']
+            has_more_items = content['has_more_items']
+            if not deep:
+                has_more_items = False
 
-            if exact:
-                marginal_query = '"' + '" "'.join(items) + '"'
-            else:
-                target = None
-                if 'target' in field:
-                    target = field['target']
-
-                if target == 'from':
-                    marginal_query = 'from:' + ' from:'.join(items)
-                elif target == 'to':
-                    marginal_query = 'to:' + ' to:'.join(items)
-                elif target == 'hashtag':
-                    marginal_query = '#' + ' #'.join(items)
-                elif target == 'mention':
-                    marginal_query = '@' + ' @'.join(items)
-                else:
-                    marginal_query = ' '.join(items)
-
-            if match == 'any':
-                marginal_query = ' OR '.join(marginal_query.split())
-            elif match == 'none':
-                marginal_query = '-' + ' -'.join(marginal_query.split())
-
-            if match == 'any':
-                encoded_query += ' (' + marginal_query + ')'
+            if 'min_position' in content:
+                position = f"&max_position={content['min_position']}"
             else:
-                encoded_query += ' ' + marginal_query
+                continue
 
-        if since is not None:
-            encoded_query += f' since:{since}'
+            for tweet in tweets:
+                seen_tweets += 1
+                yield tweet
 
-        if until is not None:
-            encoded_query += f' until:{until}'
+            # Top up from the last position if the min_tweets target wasn't achieved
+            if not has_more_items and BlueBird._below_target(seen_tweets, min_tweets):
+                has_more_items = True
 
-        if near is not None:
-            encoded_query += f' near:"{near[0]}" within:{near[1]}mi'
+            BlueBird._save_checkpoint(checkpoint, url, {
+                'position': position,
+                'seen_tweets': seen_tweets
+            }, not has_more_items)
 
-        encoded_query = encoded_query.strip()
-        encoded_query = quote(encoded_query)
+            if has_more_items:
+                time.sleep(sleep_time)
 
-        if lang is not None:
-            encoded_query += f'&l={lang}'
+    def _get_tweets_web_pipelined(self,
+                                  url,
+                                  deep,
+                                  sleep_time,
+                                  query_type,
+                                  min_tweets,
+                                  checkpoint=None):
+        url = BlueBird._get_web_url(url)
+        endpoint = f'web/{query_type}'
 
-        print(f'[Test URL] https://twitter.com/search?f=tweets&vertical=default&q={encoded_query}')
-        return encoded_query
+        state = BlueBird._load_checkpoint(checkpoint, url)
+        seen_tweets = state.get('seen_tweets', 0)
+        position = state.get('position', BlueBird._get_initial_position_web(query_type))
 
-    def _get_tweets_web(self, url, deep, sleep_time, query_type, min_tweets):
-        seen_tweets = 0
+        while True:
+            pages = self._get_pages_web(url, position, deep, sleep_time, endpoint)
+            for (page_url, position, has_more_items), future in self._pipeline(
+                    pages, BlueBird._parse_tweets_web):
+                try:
+                    tweets = future.result()
+                except Exception:
+                    _, tweets = self.retry_policy.call(endpoint, self._get_tweets_page_web,
+                                                       page_url, endpoint)
 
-        if query_type == 'user':
-            position = ''
-        elif query_type == 'search':
-            position = '&max_position=-1'
+                for tweet in tweets:
+                    seen_tweets += 1
+                    yield tweet
 
-        # Generalizar con params como los otros
-        if not '?' in url:
-            url += '?'
-        else:
-            url += '&'
-        url += 'include_available_features=1&include_entities=1'
+                BlueBird._save_checkpoint(checkpoint, url, {
+                    'position': position,
+                    'seen_tweets': seen_tweets
+                }, not has_more_items and not BlueBird._below_target(seen_tweets, min_tweets))
 
+            # Top up from the last position if the min_tweets target wasn't achieved
+            if not BlueBird._below_target(seen_tweets, min_tweets):
+                return
+            time.sleep(sleep_time)
+
+    def _get_pages_web(self, url, position, deep, sleep_time, endpoint):
         has_more_items = True
         while has_more_items:
-            new_url = f'{url}{position}&reset_error_state=false'
+            page_url = f'{url}{position}&reset_error_state=false'
+            content = self.retry_policy.call(endpoint, HttpHelper.get_json_response, page_url,
+                                             self.transport, self.json_decoder, endpoint)
 
-            done = False
-            while not done:
-                try:
-                    content = HttpHelper.get_json_response(new_url)
-                    done = True
-                except Exception:
-                    continue
-
-            items_html = content['items_html']
-            try:
-                root = document_fromstring(items_html)
-            except ParserError:
+            has_more_items = deep and content['has_more_items']
+            if 'min_position' not in content:
                 continue
+            position = f"&max_position={content['min_position']}"
 
-            has_more_items = content['has_more_items']
-            if not deep:
-                has_more_items = False
+            yield content['items_html'], (page_url, position, has_more_items)
 
-            if 'min_position' in content:
-                position = f"&max_position={content['min_position']}"
-            else:
-                continue
+            if has_more_items:
+                time.sleep(sleep_time)
 
-            tweets_data = root.xpath("//div[@data-tweet-id]")
-            tweets_content = root.xpath("//p[@lang]")
-            tweets_timestamps = root.xpath("//span[@data-time-ms]")
+    def _get_tweets_page_web(self, url, endpoint):
+        content = HttpHelper.get_json_response(url, self.transport, self.json_decoder, endpoint)
+        return content, BlueBird._parse_tweets_web(content['items_html'])
 
-            for i, tweet_data in enumerate(tweets_data):
-                seen_tweets += 1
-
-                body_html = tostring(tweets_content[i], encoding='unicode')
-                body = BlueBird.get_processed_text(body_html)
-                tweet_id = tweet_data.attrib['data-tweet-id']
-                timestamp = tweets_timestamps[i].attrib['data-time-ms']
-                language = tweets_content[i].attrib['lang']
-
-                name = tweet_data.attrib['data-name']
-                screen_name = tweet_data.attrib['data-screen-name']
-                author_id = tweet_data.attrib['data-user-id']
-
-                tweet = {
-                    'user': {
-                        'name': name,
-                        'screen_name': screen_name,
-                        'id': author_id
-                    },
-                    'id': tweet_id,
-                    'language': language,
-                    'timestamp': timestamp,
-                    'text': body,
-                    'url': f'https://twitter.com/{screen_name}/status/{tweet_id}',
-                }
-                yield tweet
+    @staticmethod
+    @metrics.timed('parse_seconds', format='html', source='tweets_web')
+    def _parse_tweets_web(items_html):
+        root = document_fromstring(items_html)
+
+        tweets_data = root.xpath("//div[@data-tweet-id]")
+        tweets_content = root.xpath("//p[@lang]")
+        tweets_timestamps = root.xpath("//span[@data-time-ms]")
+
+        tweets = []
+        for i, tweet_data in enumerate(tweets_data):
+            body = extract_text(tweets_content[i])
+            tweet_id = tweet_data.attrib['data-tweet-id']
+            timestamp = tweets_timestamps[i].attrib['data-time-ms']
+            language = tweets_content[i].attrib['lang']
+
+            name = tweet_data.attrib['data-name']
+            screen_name = tweet_data.attrib['data-screen-name']
+            author_id = tweet_data.attrib['data-user-id']
+
+            tweet = {
+                'user': {
+                    'name': name,
+                    'screen_name': screen_name,
+                    'id': author_id
+                },
+                'id': tweet_id,
+                'language': language,
+                'timestamp': timestamp,
+                'text': body,
+                'url': f'https://twitter.com/{screen_name}/status/{tweet_id}',
+            }
+            tweets.append(tweet)
+        return tweets
 
-            # Restart if the min_tweets target wasn't achieved
-            if not has_more_items and seen_tweets < min_tweets:
-                seen_tweets = 0
-                has_more_items = True
-                if query_type == 'user':
-                    position = ''
-                elif query_type == 'search':
-                    position = '&max_position=-1'
-                continue
+    @staticmethod
+    def _get_web_url(url):
+        # Generalizar con params como los otros
+        if not '?' in url:
+            url += '?'
+        else:
+            url += '&'
+        url += 'include_available_features=1&include_entities=1'
+        return url
 
-            if deep:
-                time.sleep(sleep_time)
+    @staticmethod
+    def _get_initial_position_web(query_type):
+        if query_type == 'user':
+            return ''
+        return '&max_position=-1'
 
-    def _search_web(self, query, deep, count, sleep_time, min_tweets):
+    @staticmethod
+    def _get_search_url_web(query):
         encoded_query = BlueBird._encode_query(query)
-        base_url = f'https://twitter.com/i/search/timeline?f=tweets&vertical=news&q={encoded_query}&src=typd'
-        yield from self._get_tweets_web(base_url, deep, sleep_time, 'search', min_tweets)
-
-    def _user_timeline_web(self, username, deep, count, include_replies, sleep_time, min_tweets):
-        base_url = f'https://twitter.com/i/profiles/show/{username}/timeline/tweets'
-        yield from self._get_tweets_web(base_url, deep, sleep_time, 'user', min_tweets)
+        return f'https://twitter.com/i/search/timeline?f=tweets&vertical=news&q={encoded_query}&src=typd'
 
-    def _get_tweets_2(self, url, deep, sleep_time, min_tweets):
-        seen_tweets = 0
-
-        cursor = None
+    @staticmethod
+    def _get_user_timeline_url_web(username):
+        return f'https://twitter.com/i/profiles/show/{username}/timeline/tweets'
+
+    def _search_web(self, query, deep, count, sleep_time, min_tweets, checkpoint=None):
+        base_url = BlueBird._get_search_url_web(query)
+        yield from self._get_tweets_web(base_url, deep, sleep_time, 'search', min_tweets,
+                                        checkpoint)
+
+    def _user_timeline_web(self,
+                           username,
+                           deep,
+                           count,
+                           include_replies,
+                           sleep_time,
+                           min_tweets,
+                           checkpoint=None):
+        base_url = BlueBird._get_user_timeline_url_web(username)
+        yield from self._get_tweets_web(base_url, deep, sleep_time, 'user', min_tweets,
+                                        checkpoint)
+
+    def _get_tweets_2(self, url, deep, sleep_time, min_tweets, checkpoint=None):
+        state = BlueBird._load_checkpoint(checkpoint, url)
+        seen_tweets = state.get('seen_tweets', 0)
+        cursor = state.get('cursor')
         done = False
 
         while not done:
@@ -352,7 +569,7 @@ class BlueBird:
             if cursor is not None:
                 new_url += f'&cursor={cursor}'
 
-            response = self._get_api_response(new_url)
+            response = self._get_api_response(new_url, page_2=True)
             if response is None:
                 break
 
@@ -366,24 +583,36 @@ class BlueBird:
                 done = False
                 yield tweet
 
-            try:
-                cursor = response['timeline']['instructions'][0]['addEntries']\
-                ['entries'][-1]['content']['operation']['cursor']['value']
-            except (KeyError, IndexError):
-                try:
-                    cursor = response['timeline']['instructions'][-1]['replaceEntry']\
-                    ['entry']['content']['operation']['cursor']['value']
-                except KeyError:
-                    done = True
+            next_cursor = BlueBird._get_cursor_2(response)
+            if next_cursor is None:
+                done = True
+            else:
+                cursor = next_cursor
 
-            # Restart if the min_tweets target wasn't achieved
-            if not done and seen_tweets < min_tweets:
-                seen_tweets = 0
-                cursor = None
+            # Top up from the last cursor if the min_tweets target wasn't achieved
+            if done and BlueBird._below_target(seen_tweets, min_tweets):
                 done = False
-                continue
+                time.sleep(sleep_time)
+
+            BlueBird._save_checkpoint(checkpoint, url, {
+                'cursor': cursor,
+                'seen_tweets': seen_tweets
+            }, done)
 
-    def _search_2(self, query, deep, count, sleep_time, min_tweets):
+    @staticmethod
+    def _get_cursor_2(response):
+        try:
+            return response['timeline']['instructions'][0]['addEntries']\
+            ['entries'][-1]['content']['operation']['cursor']['value']
+        except (KeyError, IndexError):
+            try:
+                return response['timeline']['instructions'][-1]['replaceEntry']\
+                ['entry']['content']['operation']['cursor']['value']
+            except KeyError:
+                return
+
+    @staticmethod
+    def _get_search_url_2(query, count):
         if count > 200:
             count = 200
 
@@ -397,14 +626,10 @@ class BlueBird:
             'tweet_mode': 'extended'
         }
 
-        url = BlueBird._update_url_with_params(base_url, params)
-        print(url)
-
-        yield from self._get_tweets_2(url, deep, sleep_time, min_tweets)
-
-    def _user_timeline_2(self, username, deep, count, include_replies, sleep_time, min_tweets):
-        user_id = self.get_user_id(username)
+        return BlueBird._update_url_with_params(base_url, params)
 
+    @staticmethod
+    def _get_user_timeline_url_2(user_id, count, include_replies):
         if count > 200:
             count = 200
 
@@ -424,14 +649,28 @@ class BlueBird:
             'include_tweet_replies': include_tweet_replies
         }
 
-        url = BlueBird._update_url_with_params(url, params)
+        return BlueBird._update_url_with_params(url, params)
 
-        yield from self._get_tweets_2(url, deep, sleep_time, min_tweets)
+    def _search_2(self, query, deep, count, sleep_time, min_tweets, checkpoint=None):
+        url = BlueBird._get_search_url_2(query, count)
+        yield from self._get_tweets_2(url, deep, sleep_time, min_tweets, checkpoint)
 
-    def _get_tweets_1_1(self, url, deep, sleep_time, min_tweets):
-        seen_tweets = 0
+    def _user_timeline_2(self,
+                         username,
+                         deep,
+                         count,
+                         include_replies,
+                         sleep_time,
+                         min_tweets,
+                         checkpoint=None):
+        user_id = self.get_user_id(username)
+        url = BlueBird._get_user_timeline_url_2(user_id, count, include_replies)
+        yield from self._get_tweets_2(url, deep, sleep_time, min_tweets, checkpoint)
 
-        max_id = None
+    def _get_tweets_1_1(self, url, deep, sleep_time, min_tweets, checkpoint=None):
+        state = BlueBird._load_checkpoint(checkpoint, url)
+        seen_tweets = state.get('seen_tweets', 0)
+        max_id = state.get('max_id')
         done = False
         while not done:
             new_url = url
@@ -444,38 +683,49 @@ class BlueBird:
             while attempts and retry and not done:
                 attempts -= 1
                 response = self._get_api_response(new_url)
-
-                # Search
-                if 'statuses' in response:
-                    tweets = response['statuses']
-                else:
-                    tweets = response
+                tweets = BlueBird._get_tweets_from_response_1_1(response)
 
                 retry = True
+                new_tweets = False
                 for tweet in tweets:
                     retry = False
+                    # max_id is inclusive, the page starts with the last tweet of the previous one
+                    if max_id == tweet['id']:
+                        continue
                     seen_tweets += 1
+                    new_tweets = True
+                    max_id = tweet['id']
+                    yield tweet
 
-                    if max_id == tweet['id']:
-                        done = True
-                    else:
-                        max_id = tweet['id']
-                        yield tweet
+                if not retry and not new_tweets:
+                    done = True
 
             if not tweets:
                 done = True
 
-            # Restart if the min_tweets target wasn't achieved
-            if done and seen_tweets < min_tweets:
+            # Top up from the last max_id if the min_tweets target wasn't achieved
+            if done and BlueBird._below_target(seen_tweets, min_tweets):
                 done = False
-                continue
-
-            if not deep:
+            elif not deep:
                 done = True
-            else:
+
+            BlueBird._save_checkpoint(checkpoint, url, {
+                'max_id': max_id,
+                'seen_tweets': seen_tweets
+            }, done)
+
+            if not done:
                 time.sleep(sleep_time)
 
-    def _search_1_1(self, query, deep, count, sleep_time, min_tweets):
+    @staticmethod
+    def _get_tweets_from_response_1_1(response):
+        # Search
+        if 'statuses' in response:
+            return response['statuses']
+        return response
+
+    @staticmethod
+    def _get_search_url_1_1(query, count):
         if count > 100:
             count = 100
 
@@ -488,11 +738,10 @@ class BlueBird:
             'result_type': 'recent',
             'include_entities': 'false'
         }
-        url = BlueBird._update_url_with_params(base_url, params)
-
-        yield from self._get_tweets_1_1(url, deep, sleep_time, min_tweets)
+        return BlueBird._update_url_with_params(base_url, params)
 
-    def _user_timeline_1_1(self, username, deep, count, include_replies, sleep_time, min_tweets):
+    @staticmethod
+    def _get_user_timeline_url_1_1(username, count, include_replies):
         if count > 200:
             count = 200
 
@@ -508,12 +757,108 @@ class BlueBird:
             'exclude_replies': exclude_tweet_replies,
             'count': count
         }
-        url = BlueBird._update_url_with_params(base_url, params)
+        return BlueBird._update_url_with_params(base_url, params)
+
+    def _search_1_1(self, query, deep, count, sleep_time, min_tweets, checkpoint=None):
+        url = BlueBird._get_search_url_1_1(query, count)
+        yield from self._get_tweets_1_1(url, deep, sleep_time, min_tweets, checkpoint)
+
+    def _user_timeline_1_1(self,
+                           username,
+                           deep,
+                           count,
+                           include_replies,
+                           sleep_time,
+                           min_tweets,
+                           checkpoint=None):
+        url = BlueBird._get_user_timeline_url_1_1(username, count, include_replies)
+        yield from self._get_tweets_1_1(url, deep, sleep_time, min_tweets, checkpoint)
+
+    @staticmethod
+    def _defer_checkpoint(generator_factory, checkpoint):
+        # For crawls run by another thread, their checkpoints are saved by the consumer
+        if checkpoint is None:
+            return partial(generator_factory, None)
 
-        yield from self._get_tweets_1_1(url, deep, sleep_time, min_tweets)
+        def generate():
+            deferred = DeferredCheckpointStore(checkpoint)
+            yield from deferred.wrap(generator_factory(deferred))
 
-    def search(self, query, deep=False, count=100, sleep_time=0, min_tweets=0, mode=API_2):
-        return getattr(self, f'_search_{mode}')(query, deep, count, sleep_time, min_tweets)
+        return generate
+
+    @staticmethod
+    def _crawl(generator_factory, checkpoint, prefetch, count):
+        if prefetch:
+            # A background thread crawls up to `prefetch` pages ahead of the consumer
+            tweets = merge_generators([BlueBird._defer_checkpoint(generator_factory, checkpoint)],
+                                      workers=1,
+                                      buffer_size=prefetch * count)
+        else:
+            tweets = generator_factory(checkpoint)
+        if checkpoint is not None:
+            tweets = apply_checkpoint_operations(tweets)
+        return tweets
+
+    def _search_sub_queries(self, generator_factories, count, min_tweets, checkpoint):
+        yielded = 0
+
+        def below_target():
+            return yielded < min_tweets
+
+        # min_tweets applies to the merged tweets, the sub-queries top up until it's reached
+        target = below_target if min_tweets else 0
+        tweets = merge_generators(
+            [BlueBird._defer_checkpoint(partial(factory, target), checkpoint)
+             for factory in generator_factories],
+            workers=self.query_workers,
+            ordered=False,
+            buffer_size=count)
+
+        # Tweets matching several sub-queries are only yielded once
+        dedup = SortedIdSet()
+        for tweet in tweets:
+            if isinstance(tweet, CheckpointOperation):
+                yield tweet
+            elif dedup.add(int(tweet['id'])):
+                yielded += 1
+                yield tweet
+
+    @staticmethod
+    def _to_records(tweets, mode, fields):
+        if fields == '*':
+            fields = None
+        extractors = Tweet._get_extractors(getattr(Tweet, f'_EXTRACTORS_{mode.upper()}'), fields)
+        for tweet in tweets:
+            yield Tweet._build(extractors, tweet)
+
+    def search(self,
+               query,
+               deep=False,
+               count=100,
+               sleep_time=0,
+               min_tweets=0,
+               mode=API_2,
+               checkpoint=None,
+               fields=None,
+               dedup=None,
+               prefetch=0):
+        search_mode = getattr(self, f'_search_{mode}')
+        queries = [query]
+        if self.max_query_length:
+            queries = default_compiler.split(query, self.max_query_length)
+        if len(queries) > 1:
+            tweets = partial(self._search_sub_queries, [
+                partial(search_mode, sub_query, deep, count, sleep_time) for sub_query in queries
+            ], count, min_tweets)
+        else:
+            tweets = partial(search_mode, query, deep, count, sleep_time, min_tweets)
+        tweets = BlueBird._crawl(tweets, checkpoint, prefetch, count)
+        tweets = metrics.count_items(tweets, generator='search', mode=mode)
+        if dedup is not None:
+            tweets = dedup.filter(tweets)
+        if fields is not None:
+            tweets = BlueBird._to_records(tweets, mode, fields)
+        return tweets
 
     def user_timeline(self,
                       username,
@@ -522,85 +867,221 @@ class BlueBird:
                       include_replies=True,
                       sleep_time=0,
                       min_tweets=0,
-                      mode=API_2):
-        return getattr(self, f'_user_timeline_{mode}')(username, deep, count, include_replies,
-                                                       sleep_time, min_tweets)
+                      mode=API_2,
+                      checkpoint=None,
+                      fields=None,
+                      dedup=None,
+                      prefetch=0):
+        tweets = partial(getattr(self, f'_user_timeline_{mode}'), username, deep, count,
+                         include_replies, sleep_time, min_tweets)
+        tweets = BlueBird._crawl(tweets, checkpoint, prefetch, count)
+        tweets = metrics.count_items(tweets, generator='user_timeline', mode=mode)
+        if dedup is not None:
+            tweets = dedup.filter(tweets)
+        if fields is not None:
+            tweets = BlueBird._to_records(tweets, mode, fields)
+        return tweets
+
+    def sharded_search(self,
+                       query,
+                       shards=4,
+                       workers=None,
+                       ordered=True,
+                       count=100,
+                       sleep_time=0,
+                       mode=API_2,
+                       dedup=None,
+                       buffer_size=10000):
+        queries = split_query(query, shards)
+        generator_factories = [
+            partial(self.search, shard_query, True, count, sleep_time, 0, mode)
+            for shard_query in queries
+        ]
+
+        if dedup is None:
+            dedup = SortedIdSet()
+        # Shards ahead of the one being yielded stop at buffer_size tweets each
+        yield from dedup.filter(
+            merge_generators(generator_factories,
+                             workers=workers,
+                             ordered=ordered,
+                             buffer_size=buffer_size))
+
+    def stream(self,
+               query,
+               sleep_time=0,
+               mode=API_2,
+               max_sleep_time=60,
+               on_error=None,
+               dedup=None):
+        tweets = iter(
+            StreamPoller(self,
+                         query,
+                         mode,
+                         min_interval=sleep_time,
+                         max_interval=max(sleep_time, max_sleep_time),
+                         on_error=on_error))
+        if dedup is not None:
+            tweets = dedup.filter(tweets)
+        return tweets
+
+    @_default_client_method
+    def get_list_members(self, username, list_name):
+        if self.parse_workers:
+            yield from self._get_list_members_pipelined(username, list_name)
+            return
 
-    def stream(self, query, sleep_time=0, mode=API_2):
-        known_tweets = CircularOrderedSet(50)
-        while True:
+        has_more_items = True
+        min_position = -1
+
+        while has_more_items:
+            url = BlueBird._get_list_members_url(username, list_name, min_position)
+            content, members = self.retry_policy.call('web/list_members',
+                                                      self._get_list_members_page, url,
+                                                      'web/list_members')
+
+            has_more_items = content['has_more_items']
+            min_position = content['min_position']
+
+            yield from members
+
+    def _get_list_members_pipelined(self, username, list_name):
+        pages = self._get_pages_list_members(username, list_name)
+        for url, future in self._pipeline(pages, BlueBird._parse_list_members):
             try:
-                for tweet in self.search(query, mode=mode):
-                    if tweet['id'] not in known_tweets:
-                        known_tweets.add(tweet['id'])
-                        yield tweet
+                members = future.result()
             except Exception:
-                pass
-            time.sleep(sleep_time)
+                _, members = self.retry_policy.call('web/list_members',
+                                                    self._get_list_members_page, url,
+                                                    'web/list_members')
+            yield from members
 
-    @staticmethod
-    def get_list_members(username, list_name):
+    def _get_pages_list_members(self, username, list_name):
         has_more_items = True
         min_position = -1
 
         while has_more_items:
-            url = f'https://twitter.com/{username}/lists/{list_name}/members/timeline?include_available_features=1&include_entities=1&max_position={min_position}&reset_error_state=false'
-            content = HttpHelper.get_json_response(url)
-
-            items_html = content['items_html']
-            try:
-                root = document_fromstring(items_html)
-            except ParserError:
-                continue
+            url = BlueBird._get_list_members_url(username, list_name, min_position)
+            content = self.retry_policy.call('web/list_members', HttpHelper.get_json_response, url,
+                                             self.transport, self.json_decoder,
+                                             'web/list_members')
 
             has_more_items = content['has_more_items']
             min_position = content['min_position']
 
-            account_elements = root.xpath(
-                "//div[contains(@class, 'account') and @data-screen-name]")
-
-            for account in account_elements:
-                name = account.attrib['data-name']
-                screen_name = account.attrib['data-screen-name']
-                author_id = account.attrib['data-user-id']
+            yield content['items_html'], url
 
-                yield {'name': name, 'screen_name': screen_name, 'id': author_id}
+    def _get_list_members_page(self, url, endpoint):
+        content = HttpHelper.get_json_response(url, self.transport, self.json_decoder, endpoint)
+        return content, BlueBird._parse_list_members(content['items_html'])
 
     @staticmethod
-    def get_followings(username):
-        return BlueBird.get_followx(username, target='followings')
+    def _get_list_members_url(username, list_name, min_position):
+        return f'https://twitter.com/{username}/lists/{list_name}/members/timeline?include_available_features=1&include_entities=1&max_position={min_position}&reset_error_state=false'
 
     @staticmethod
-    def get_followers(username):
-        return BlueBird.get_followx(username, target='followers')
+    @metrics.timed('parse_seconds', format='html', source='list_members')
+    def _parse_list_members(items_html):
+        root = document_fromstring(items_html)
+        account_elements = root.xpath("//div[contains(@class, 'account') and @data-screen-name]")
+
+        members = []
+        for account in account_elements:
+            name = account.attrib['data-name']
+            screen_name = account.attrib['data-screen-name']
+            author_id = account.attrib['data-user-id']
+
+            members.append({'name': name, 'screen_name': screen_name, 'id': author_id})
+        return members
+
+    @_default_client_method
+    def get_followings(self, username):
+        return self.get_followx(username, target='followings')
+
+    @_default_client_method
+    def get_followers(self, username):
+        return self.get_followx(username, target='followers')
+
+    @_default_client_method
+    def get_followx(self, username, target):
+        if self.parse_workers:
+            yield from self._get_followx_pipelined(username, target)
+            return
 
-    @staticmethod
-    def get_followx(username, target):
         has_more_items = True
         min_position = 0
 
         while has_more_items:
-            url = f'https://mobile.twitter.com/{username}/{target}?lang=en'
-            if min_position:
-                url += f'&cursor={min_position}'
-                
-            content = HttpHelper.get_html_response(url)
-            try:
-                root = document_fromstring(bytes(content, encoding='utf-8'))
-            except ParserError:
-                continue
+            url = BlueBird._get_followx_url(username, target, min_position)
+            endpoint = f'mobile/{target}'
+            screen_names, min_position = self.retry_policy.call(endpoint, self._get_followx_page,
+                                                                url, endpoint)
 
-            account_elements = root.xpath("//td[contains(@class, 'screenname')]/a[@name]")
+            yield from screen_names
 
-            for account in account_elements:
-                screen_name = account.attrib['name']
-                yield screen_name
+            if min_position is None:
+                has_more_items = False
 
+    def _get_followx_pipelined(self, username, target):
+        endpoint = f'mobile/{target}'
+        pages = self._get_pages_followx(username, target, endpoint)
+        for url, future in self._pipeline(pages, BlueBird._parse_followx):
             try:
-                min_position = root.xpath(
-                    "//div[@class='w-button-more']/a")[0].attrib['href'].split('cursor=')[1]
-            except IndexError:
-                has_more_items = False
+                screen_names, _ = future.result()
+            except Exception:
+                screen_names, _ = self.retry_policy.call(endpoint, self._get_followx_page, url,
+                                                         endpoint)
+            yield from screen_names
+
+    def _get_pages_followx(self, username, target, endpoint):
+        min_position = 0
+        while True:
+            url = BlueBird._get_followx_url(username, target, min_position)
+            content = self.retry_policy.call(endpoint, HttpHelper.get_html_response, url,
+                                             self.transport, endpoint)
+            min_position = BlueBird._get_followx_cursor(content)
+
+            yield content, url
+
+            if min_position is None:
+                return
+
+    @staticmethod
+    def _get_followx_cursor(content):
+        # Same cursor as _parse_followx, without parsing the whole page
+        match = BlueBird.followx_cursor_regex.search(content)
+        if match is None:
+            return
+        try:
+            return unescape(match.group(1)).split('cursor=')[1]
+        except IndexError:
+            return
+
+    def _get_followx_page(self, url, endpoint):
+        return BlueBird._parse_followx(HttpHelper.get_html_response(url, self.transport, endpoint))
+
+    @staticmethod
+    def _get_followx_url(username, target, min_position):
+        url = f'https://mobile.twitter.com/{username}/{target}?lang=en'
+        if min_position:
+            url += f'&cursor={min_position}'
+        return url
+
+    @staticmethod
+    @metrics.timed('parse_seconds', format='html', source='followx')
+    def _parse_followx(content):
+        root = document_fromstring(bytes(content, encoding='utf-8'))
+
+        account_elements = root.xpath("//td[contains(@class, 'screenname')]/a[@name]")
+        screen_names = [account.attrib['name'] for account in account_elements]
+
+        try:
+            min_position = root.xpath(
+                "//div[@class='w-button-more']/a")[0].attrib['href'].split('cursor=')[1]
+        except IndexError:
+            min_position = None
+
+        return screen_names, min_position
 
     @staticmethod
     def get_hashtags(place):
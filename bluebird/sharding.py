@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from queue import Queue, Full
+from threading import Event
+
+_DONE = object()
+
+
+class _Failure:
+    __slots__ = ('exception', )
+
+    def __init__(self, exception):
+        self.exception = exception
+
+
+def _parse_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def _split_range(start, end, shards):
+    # Returns up to `shards` contiguous [start, end) slices, newest first
+    length = end - start
+    shards = max(1, min(shards, length))
+    bounds = [start + (length * i) // shards for i in range(shards + 1)]
+    return [(bounds[i], bounds[i + 1]) for i in reversed(range(shards))]
+
+
+def split_query(query, shards):
+    """
+    Splits a query into disjoint sub-queries over its tweet-ID range
+    (since_id/max_id) or its date range (since/until). The slices are
+    returned newest first, the same order the search endpoints use.
+    """
+    if 'since_id' in query and 'max_id' in query:
+        # since_id is exclusive and max_id inclusive, the IDs are since_id + 1 to max_id
+        slices = _split_range(int(query['since_id']) + 1, int(query['max_id']) + 1, shards)
+        queries = []
+        for start, end in slices:
+            sub_query = dict(query)
+            sub_query['since_id'] = start - 1
+            sub_query['max_id'] = end - 1
+            queries.append(sub_query)
+        return queries
+
+    if 'since' not in query:
+        raise ValueError('a sharded query needs either since/until or since_id/max_id')
+
+    since = _parse_date(query['since'])
+    if 'until' in query:
+        until = _parse_date(query['until'])
+    else:
+        until = datetime.utcnow().date() + timedelta(days=1)
+
+    slices = _split_range(since.toordinal(), until.toordinal(), shards)
+    queries = []
+    for start, end in slices:
+        sub_query = dict(query)
+        sub_query['since'] = date.fromordinal(start).isoformat()
+        sub_query['until'] = date.fromordinal(end).isoformat()
+        queries.append(sub_query)
+    return queries
+
+
+def _put(queue, item, stop):
+    while not stop.is_set():
+        try:
+            queue.put(item, timeout=0.1)
+            return True
+        except Full:
+            continue
+    return False
+
+
+def _drain(generator_factory, queue, stop, index):
+    try:
+        for item in generator_factory():
+            if not _put(queue, (index, item), stop):
+                return
+    except Exception as e:
+        _put(queue, (index, _Failure(e)), stop)
+    _put(queue, (index, _DONE), stop)
+
+
+def merge_generators(generator_factories, workers=None, ordered=True, buffer_size=0):
+    """
+    Runs every generator in a pool of threads and yields their items. If
+    `ordered` is set, the items of the n-th generator are yielded before those
+    of the next one (the rest are buffered meanwhile); otherwise they are
+    yielded as soon as they arrive. Producers block once `buffer_size` items
+    are waiting (0 means no limit).
+    """
+    if workers is None:
+        workers = len(generator_factories)
+    if not generator_factories:
+        return
+
+    stop = Event()
+    if ordered:
+        queues = [Queue(buffer_size) for _ in generator_factories]
+    else:
+        queues = [Queue(buffer_size)] * len(generator_factories)
+
+    executor = ThreadPoolExecutor(max_workers=max(1, workers))
+    try:
+        for index, generator_factory in enumerate(generator_factories):
+            executor.submit(_drain, generator_factory, queues[index], stop, index)
+
+        pending = len(generator_factories)
+        current = 0
+        while pending:
+            queue = queues[current] if ordered else queues[0]
+            _, item = queue.get()
+
+            if item is _DONE:
+                pending -= 1
+                current += 1
+            elif isinstance(item, _Failure):
+                raise item.exception
+            else:
+                yield item
+    finally:
+        stop.set()
+        executor.shutdown(wait=False)
@@ -0,0 +1,307 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from .records import Record, Tweet
+from .optional import import_optional
+from abc import ABC, abstractmethod
+import json
+import gzip
+import time
+import os
+
+
+def _to_dict(item):
+    if isinstance(item, Record):
+        return item.to_dict()
+    return item
+
+
+class Sink(ABC):
+    """
+    Consumes any BlueBird generator and writes it in batches of `batch_size`
+    items. The output is rotated into a new file every `max_bytes` bytes or
+    `max_seconds` seconds, named after `path` with a `{index}` placeholder
+    (added before the extension when rotating and missing). Files stop
+    growing within a few records past `max_bytes`.
+    """
+
+    def __init__(self, path, batch_size=10000, max_bytes=None, max_seconds=None):
+        if (max_bytes or max_seconds) and '{index' not in path:
+            root, extension = os.path.splitext(path)
+            if extension in ('.gz', '.zst'):
+                root, inner_extension = os.path.splitext(root)
+                extension = inner_extension + extension
+            path = f'{root}-{{index:05d}}{extension}'
+        self.path = path
+        self.batch_size = batch_size
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+
+        self.index = 0
+        self.paths = []
+        self.items = 0
+        self._batch = []
+        self._file = None
+        self._file_items = 0
+        self._opened_at = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, item):
+        if self.max_seconds:
+            self._rotate_on_time()
+        self._batch.append(item)
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def consume(self, items):
+        batch = self._batch
+        batch_size = self.batch_size
+        max_seconds = self.max_seconds
+        deadline = None
+        for item in items:
+            if max_seconds and (deadline is None or time.time() >= deadline):
+                deadline = self._rotate_on_time()
+                batch = self._batch
+            batch.append(item)
+            if len(batch) >= batch_size:
+                self.flush()
+                batch = self._batch
+                deadline = None
+        return self.items + len(batch)
+
+    def _rotate_on_time(self):
+        # Time-based rotation doesn't wait for a full batch, the partial one
+        # goes to the file whose time is up. Returns the rotation deadline.
+        if self._file is not None and time.time() - self._opened_at >= self.max_seconds:
+            self.flush()
+        if self._file is None:
+            self._open()
+        return self._opened_at + self.max_seconds
+
+    def flush(self):
+        batch = self._batch
+        self._batch = []
+        start = 0
+        while start < len(batch):
+            if self._file is None:
+                self._open()
+            count = len(batch) - start
+            if self.max_bytes:
+                count = self._fit(count)
+            self._write_batch(batch[start:start + count] if start or count < len(batch) else batch)
+            start += count
+            self.items += count
+            self._file_items += count
+            if self._must_rotate():
+                self._close_file()
+
+        if self._file is not None and self._must_rotate():
+            self._close_file()
+
+    def _fit(self, count):
+        # Items expected to fit in the rest of the file from its average item size,
+        # so the size limit is checked every few records instead of every batch
+        if not self._file_items:
+            return min(count, 16)
+        size = self._get_size()
+        item_size = max(size / self._file_items, 1)
+        return max(1, min(count, int((self.max_bytes - size) / item_size)))
+
+    def _must_rotate(self):
+        if self.max_bytes and self._get_size() >= self.max_bytes:
+            return True
+        return bool(self.max_seconds) and time.time() - self._opened_at >= self.max_seconds
+
+    def _open(self):
+        path = self.path.format(index=self.index, timestamp=int(time.time()))
+        self.index += 1
+        self.paths.append(path)
+        self._file_items = 0
+        self._opened_at = time.time()
+        self._open_file(path)
+
+    def close(self):
+        self.flush()
+        if self._file is not None:
+            self._close_file()
+
+    @abstractmethod
+    def _open_file(self, path):
+        pass
+
+    @abstractmethod
+    def _write_batch(self, batch):
+        pass
+
+    @abstractmethod
+    def _get_size(self):
+        pass
+
+    def _close_file(self):
+        self._file.close()
+        self._file = None
+
+
+class JSONLSink(Sink):
+    """
+    Writes one JSON document per line, gzip-compressed unless `compresslevel`
+    is 0. Every batch is encoded and compressed in a single write.
+    """
+
+    def __init__(self,
+                 path,
+                 batch_size=10000,
+                 max_bytes=None,
+                 max_seconds=None,
+                 compresslevel=6):
+        super(JSONLSink, self).__init__(path, batch_size, max_bytes, max_seconds)
+        self.compresslevel = compresslevel
+        self._raw_file = None
+        orjson = import_optional('orjson')
+        if orjson is not None:
+            self._dumps = orjson.dumps
+        else:
+            encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+            self._dumps = lambda item: encoder.encode(item).encode('utf-8')
+
+    def _open_file(self, path):
+        self._raw_file = open(path, 'wb')
+        if self.compresslevel:
+            self._file = gzip.GzipFile(fileobj=self._raw_file,
+                                       mode='wb',
+                                       compresslevel=self.compresslevel)
+        else:
+            self._file = self._raw_file
+
+    def _write_batch(self, batch):
+        dumps = self._dumps
+        lines = [dumps(_to_dict(item)) for item in batch]
+        lines.append(b'')
+        self._file.write(b'\n'.join(lines))
+
+    def _get_size(self):
+        # Compressed bytes written so far, including the ones still buffered by zlib
+        if self._file is not self._raw_file:
+            self._file.flush()
+        return self._raw_file.tell()
+
+    def _close_file(self):
+        self._file.close()
+        if self._raw_file is not self._file:
+            self._raw_file.close()
+        self._file = self._raw_file = None
+
+
+class ColumnarSink(Sink):
+    """
+    Writes tweets with a fixed schema as Parquet (`file_format='parquet'`) or as
+    an Arrow IPC file (`file_format='arrow'`), one row group per batch. Items can
+    be Tweet records or the raw tweets of the given `mode`. Requires pyarrow
+    (pip install bluebird[parquet]).
+    """
+
+    COLUMNS = (('id', 'string'), ('created_at', 'timestamp'), ('text', 'string'),
+               ('language', 'string'), ('user_id', 'string'), ('user_screen_name', 'string'),
+               ('user_name', 'string'), ('url', 'string'), ('retweet_count', 'int64'),
+               ('favorite_count', 'int64'), ('reply_count', 'int64'),
+               ('in_reply_to_status_id', 'string'))
+
+    def __init__(self,
+                 path,
+                 mode=None,
+                 file_format='parquet',
+                 batch_size=100000,
+                 max_bytes=None,
+                 max_seconds=None,
+                 compression='zstd'):
+        if import_optional('pyarrow') is None:
+            raise ImportError('ColumnarSink requires pyarrow (pip install bluebird[parquet])')
+        import_optional('pyarrow.parquet')
+        import_optional('pyarrow.ipc')
+        if file_format not in ('parquet', 'arrow'):
+            raise ValueError('file_format must be either parquet or arrow')
+        super(ColumnarSink, self).__init__(path, batch_size, max_bytes, max_seconds)
+        self.mode = mode
+        self.file_format = file_format
+        self.compression = compression
+        self.schema = ColumnarSink.get_schema()
+        self._extractors = None
+        if mode is not None:
+            self._extractors = Tweet._get_extractors(getattr(Tweet, f'_EXTRACTORS_{mode.upper()}'),
+                                                     None)
+        self._raw_file = None
+        self._current_path = None
+
+    @staticmethod
+    def get_schema():
+        pyarrow = import_optional('pyarrow')
+        types = {
+            'string': pyarrow.string(),
+            'int64': pyarrow.int64(),
+            'timestamp': pyarrow.timestamp('ms', tz='UTC')
+        }
+        return pyarrow.schema([(name, types[column_type])
+                               for name, column_type in ColumnarSink.COLUMNS])
+
+    def _get_columns(self, batch):
+        columns = {name: [] for name, _ in ColumnarSink.COLUMNS}
+        user_columns = (columns['user_id'], columns['user_screen_name'], columns['user_name'])
+        tweet_columns = [(name, columns[name]) for name, _ in ColumnarSink.COLUMNS
+                         if not name.startswith('user_')]
+
+        for item in batch:
+            if not isinstance(item, Record):
+                if self._extractors is None:
+                    raise ValueError('raw tweets need the mode they were crawled with')
+                item = Tweet._build(self._extractors, item)
+            for name, column in tweet_columns:
+                column.append(getattr(item, name))
+
+            user = item.user
+            if user is None:
+                for column in user_columns:
+                    column.append(None)
+            else:
+                user_columns[0].append(user.id)
+                user_columns[1].append(user.screen_name)
+                user_columns[2].append(user.name)
+
+        columns['id'] = [None if value is None else str(value) for value in columns['id']]
+        columns['user_id'] = [
+            None if value is None else str(value) for value in columns['user_id']
+        ]
+        return columns
+
+    def _open_file(self, path):
+        pyarrow = import_optional('pyarrow')
+        if self.file_format == 'parquet':
+            self._file = pyarrow.parquet.ParquetWriter(path,
+                                                       self.schema,
+                                                       compression=self.compression)
+        else:
+            self._raw_file = pyarrow.OSFile(path, 'wb')
+            options = pyarrow.ipc.IpcWriteOptions(compression=self.compression)
+            self._file = pyarrow.ipc.new_file(self._raw_file, self.schema, options=options)
+        self._current_path = path
+
+    def _write_batch(self, batch):
+        pyarrow = import_optional('pyarrow')
+        table = pyarrow.Table.from_pydict(self._get_columns(batch), schema=self.schema)
+        self._file.write_table(table)
+
+    def _get_size(self):
+        if self._raw_file is not None:
+            return self._raw_file.tell()
+        # Parquet writers flush a row group on every write_table
+        return os.path.getsize(self._current_path)
+
+    def _close_file(self):
+        self._file.close()
+        if self._raw_file is not None:
+            self._raw_file.close()
+        self._file = self._raw_file = None
@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Guest token budgets are reset every 15 minutes
+RATE_LIMIT_WINDOW = 900
+
+# Rate-limited endpoint polled by each mode, as named by RateLimitScheduler
+SEARCH_ENDPOINTS = {'2': '/2/search/adaptive.json', '1_1': '/1.1/search/tweets.json'}
+
+
+class _Poll:
+    __slots__ = ('first', 'started', 'max_id', 'new_tweets', 'known_streak')
+
+    def __init__(self, first, started, max_id):
+        self.first = first
+        self.started = started
+        self.max_id = max_id
+        self.new_tweets = 0
+        self.known_streak = 0
+
+
+class StreamPoller:
+    """
+    Polls a search for new tweets. Every poll only asks for tweets newer than
+    the highest ID seen so far (since_id) and stops paginating when it gets
+    back to known tweets. The interval between polls follows the observed
+    arrival rate, aiming at `target_batch` tweets per poll, and is stretched
+    when the guest tokens are running out of budget.
+    """
+
+    def __init__(self,
+                 bluebird,
+                 query,
+                 mode,
+                 count=100,
+                 min_interval=0,
+                 max_interval=60,
+                 target_batch=None,
+                 on_error=None):
+        self.bluebird = bluebird
+        self.query = query
+        self.mode = mode
+        self.count = count
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.target_batch = target_batch if target_batch is not None else max(1, count // 2)
+        self.on_error = on_error
+
+        self.since_id = None
+        self.interval = min_interval
+        self.rate = None
+        self.polls = 0
+        self.errors = 0
+        self._last_poll = None
+        # IDs yielded by the current poll, kept if it fails so the retry skips them
+        self._yielded_ids = set()
+
+    def __iter__(self):
+        while True:
+            started = time.time()
+            try:
+                yield from self.poll()
+            except Exception as e:
+                self._handle_error(e)
+            self._wait(started)
+
+    def _start_poll(self):
+        query = dict(self.query)
+        poll = _Poll(self.since_id is None, time.time(), self.since_id)
+        if not poll.first:
+            query['since_id'] = self.since_id
+        return query, poll
+
+    def _accept(self, poll, tweet):
+        # True to yield the tweet, False to skip it and None to stop paginating
+        tweet_id = int(tweet['id'])
+        if self.since_id is not None and tweet_id <= self.since_id:
+            # A whole page of known tweets means we are back in the seen range
+            poll.known_streak += 1
+            if poll.known_streak >= self.count:
+                return
+            return False
+        poll.known_streak = 0
+
+        if poll.max_id is None or tweet_id > poll.max_id:
+            poll.max_id = tweet_id
+        if tweet_id in self._yielded_ids:
+            return False
+        self._yielded_ids.add(tweet_id)
+        poll.new_tweets += 1
+        return True
+
+    def _is_full(self, poll):
+        return poll.first and len(self._yielded_ids) >= self.count
+
+    def _finish_poll(self, poll):
+        self.since_id = poll.max_id
+        self._yielded_ids.clear()
+        self.polls += 1
+        if not poll.first:
+            self._update_interval(poll.new_tweets, poll.started)
+        self._last_poll = poll.started
+
+    def poll(self):
+        query, poll = self._start_poll()
+        tweets = self.bluebird.search(query, not poll.first, self.count, 0, 0, self.mode)
+        try:
+            for tweet in tweets:
+                accepted = self._accept(poll, tweet)
+                if accepted is None:
+                    break
+                if accepted:
+                    yield tweet
+                    if self._is_full(poll):
+                        break
+        finally:
+            if hasattr(tweets, 'close'):
+                tweets.close()
+        self._finish_poll(poll)
+
+    def _update_interval(self, new_tweets, now):
+        elapsed = max(now - self._last_poll, 1e-3)
+        observed_rate = new_tweets / elapsed
+        if self.rate is None:
+            self.rate = observed_rate
+        else:
+            self.rate = 0.7 * self.rate + 0.3 * observed_rate
+
+        if self.rate > 0:
+            interval = self.target_batch / self.rate
+        else:
+            interval = max(self.interval, 1) * 1.5
+
+        self.interval = min(max(interval, self.min_interval), self.max_interval)
+
+    def _get_budget_interval(self):
+        rate_limits = getattr(self.bluebird, 'rate_limits', None)
+        endpoint = SEARCH_ENDPOINTS.get(self.mode)
+        if rate_limits is None or endpoint is None:
+            return 0
+        budget = rate_limits.get_budget(endpoint)
+        if budget is None:
+            return 0
+        budget_interval = RATE_LIMIT_WINDOW / max(budget, 1)
+        return min(budget_interval, self.max_interval)
+
+    def _handle_error(self, exception):
+        self.errors += 1
+        self.interval = min(max(self.interval, 1) * 2, self.max_interval)
+        if self.on_error is not None:
+            self.on_error(exception)
+        else:
+            logger.warning('stream poll failed: %r', exception, exc_info=exception)
+
+    def get_interval(self):
+        return max(self.interval, self._get_budget_interval())
+
+    def _wait(self, started):
+        interval = self.get_interval()
+        remaining = interval - (time.time() - started)
+        if remaining > 0:
+            time.sleep(remaining)
+
+
+class AsyncStreamPoller(StreamPoller):
+    """
+    StreamPoller for AsyncBlueBird, iterated with `async for`.
+    """
+
+    async def __aiter__(self):
+        while True:
+            started = time.time()
+            try:
+                async for tweet in self.poll():
+                    yield tweet
+            except Exception as e:
+                self._handle_error(e)
+            remaining = self.get_interval() - (time.time() - started)
+            if remaining > 0:
+                await asyncio.sleep(remaining)
+
+    async def poll(self):
+        query, poll = self._start_poll()
+        tweets = self.bluebird.search(query, not poll.first, self.count, 0, 0, self.mode)
+        try:
+            async for tweet in tweets:
+                accepted = self._accept(poll, tweet)
+                if accepted is None:
+                    break
+                if accepted:
+                    yield tweet
+                    if self._is_full(poll):
+                        break
+        finally:
+            await tweets.aclose()
+        self._finish_poll(poll)
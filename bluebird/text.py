@@ -0,0 +1,25 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from lxml.etree import iterwalk
+import re
+
+whitespace_regex = re.compile(r'\s+')
+
+
+def extract_text(element):
+    # Single pass over an already parsed element, emojis (<img alt>) are kept inline
+    parts = []
+    for event, node in iterwalk(element, events=('start', 'end')):
+        if event == 'start':
+            if node.tag == 'img':
+                alt = node.get('alt')
+                if alt:
+                    parts.append(f' {alt} ')
+            elif node.text and isinstance(node.tag, str):
+                parts.append(node.text)
+        elif node is not element and node.tail:
+            parts.append(node.tail)
+
+    text = ''.join(parts).replace('…', '')
+    return whitespace_regex.sub(' ', text).strip()
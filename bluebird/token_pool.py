@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from collections import deque
+from . import metrics
+from threading import Condition, Thread
+import json
+import time
+import os
+
+
+class GuestToken:
+    __slots__ = ('value', 'created_at', 'expires_at', 'uses', 'remaining', 'healthy')
+
+    def __init__(self, value, ttl, budget):
+        self.value = value
+        self.created_at = time.time()
+        self.expires_at = self.created_at + ttl
+        self.uses = 0
+        self.remaining = budget
+        self.healthy = True
+
+    def is_usable(self, now):
+        return self.healthy and (self.remaining is None
+                                 or self.remaining > 0) and now < self.expires_at
+
+    def to_record(self):
+        return {
+            'value': self.value,
+            'created_at': self.created_at,
+            'expires_at': self.expires_at,
+            'remaining': self.remaining
+        }
+
+    @staticmethod
+    def from_record(record):
+        token = GuestToken(record['value'], 0, record['remaining'])
+        token.created_at = record['created_at']
+        token.expires_at = record['expires_at']
+        return token
+
+    def __repr__(self):
+        return f'GuestToken({self.value}, uses={self.uses}, remaining={self.remaining})'
+
+
+class GuestTokenCache:
+    """
+    On-disk (JSON) cache of guest tokens, shared by every process using the
+    same `path`, so new processes start with the tokens that are still valid
+    instead of fetching new ones. Tokens expiring within `margin` seconds
+    are left out.
+    """
+
+    def __init__(self, path, margin=60):
+        self.path = path
+        self.margin = margin
+
+    def _read(self):
+        try:
+            with open(self.path, encoding='utf-8') as cache_file:
+                return json.load(cache_file)
+        except (OSError, ValueError):
+            return []
+
+    def _is_valid(self, record, now):
+        return (record['remaining'] is None
+                or record['remaining'] > 0) and record['expires_at'] - self.margin > now
+
+    def load(self):
+        now = time.time()
+        return [GuestToken.from_record(record) for record in self._read()
+                if self._is_valid(record, now)]
+
+    def save(self, tokens, dropped=()):
+        # Tokens saved by other processes are kept, unless this one dropped them
+        records = {record['value']: record for record in self._read()}
+        for value in dropped:
+            records.pop(value, None)
+        records.update((token.value, token.to_record()) for token in tokens)
+
+        now = time.time()
+        temporary_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(temporary_path, 'w', encoding='utf-8') as cache_file:
+            json.dump([record for record in records.values() if self._is_valid(record, now)],
+                      cache_file)
+        os.replace(temporary_path, self.path)
+
+
+class GuestTokenPool:
+    """
+    Thread-safe pool of guest tokens. Tokens are handed out round-robin, so the
+    next token is always the least recently (and least) used one. Tokens that
+    expire or get retired are replaced in the background. The per-endpoint
+    budgets come from the rate limit headers (see RateLimitScheduler); with a
+    `budget`, tokens are also replaced after that many uses.
+    While no token is usable and fetching keeps failing, `acquire` raises the
+    last fetch error instead of waiting, so callers can retry or give up.
+    Without `prewarm`, no token is fetched until the first one is acquired.
+    With a GuestTokenCache, the still valid tokens of earlier processes are
+    reused and the new ones are saved for the next.
+    """
+
+    def __init__(self, fetch_token=None, size=1, ttl=10800, budget=None, refresh_threshold=10,
+                 prewarm=True, cache=None):
+        if fetch_token is None:
+            from .scraper import BlueBird
+            fetch_token = BlueBird._get_guest_token
+        self.fetch_token = fetch_token
+        self.size = size
+        self.ttl = ttl
+        self.budget = budget
+        self.refresh_threshold = refresh_threshold
+        self.cache = cache
+
+        self.acquisitions = 0
+        self.fetched = 0
+        self.retired = 0
+        self.fetch_errors = 0
+
+        self._tokens = deque()
+        self._healthy = 0
+        self._pending = 0
+        self._condition = Condition()
+        self._fetcher = None
+        self._closed = False
+        self._dropped = set()
+        self._fetch_error = None
+
+        if cache is not None:
+            for token in cache.load():
+                self._tokens.append(token)
+                self._healthy += 1
+
+        if prewarm:
+            self.refill()
+
+    def __len__(self):
+        return self._healthy
+
+    def remaining(self):
+        if self.budget is None:
+            return
+        now = time.time()
+        with self._condition:
+            return sum(token.remaining for token in self._tokens if token.is_usable(now))
+
+    def acquire(self, block=True, timeout=None):
+        deadline = None if timeout is None else time.time() + timeout
+        with self._condition:
+            while True:
+                token = self._next_usable_token()
+                if token is not None:
+                    token.uses += 1
+                    self.acquisitions += 1
+                    if token.remaining is not None:
+                        token.remaining -= 1
+                    if (token.remaining is not None and token.remaining <= self.refresh_threshold) \
+                            or token.expires_at - time.time() < self.ttl * 0.1:
+                        self._request_refill(1)
+                    return token
+
+                # Every token was dropped above, fill the pool up to its size
+                self._request_refill(0)
+                if self._fetch_error is not None:
+                    raise self._fetch_error
+                if not block:
+                    return
+                wait_time = None if deadline is None else deadline - time.time()
+                if wait_time is not None and wait_time <= 0:
+                    return
+                self._condition.wait(wait_time)
+
+    def release(self, token):
+        # Gives back an acquisition that wasn't used for a request
+        with self._condition:
+            token.uses -= 1
+            if token.remaining is not None:
+                token.remaining += 1
+            self.acquisitions -= 1
+
+    def retire(self, token):
+        with self._condition:
+            self._retire(token)
+            self._request_refill(0)
+
+    def refill(self):
+        with self._condition:
+            self._request_refill(0)
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._save()
+
+    def _save(self):
+        if self.cache is None:
+            return
+        now = time.time()
+        with self._condition:
+            tokens = [token for token in self._tokens if token.is_usable(now)]
+            dropped = list(self._dropped)
+        try:
+            self.cache.save(tokens, dropped)
+        except OSError:
+            # The cache only saves startup time, the pool works without it
+            pass
+
+    def _next_usable_token(self):
+        now = time.time()
+        # Unusable tokens are dropped lazily, each one at most once
+        for _ in range(len(self._tokens)):
+            token = self._tokens.popleft()
+            if token.is_usable(now):
+                self._tokens.append(token)
+                return token
+            self._retire(token)
+
+    def _retire(self, token):
+        if token.healthy:
+            token.healthy = False
+            self._healthy -= 1
+            self.retired += 1
+            if self.cache is not None:
+                self._dropped.add(token.value)
+            metrics.emit('guest_token_rotations')
+
+    def _request_refill(self, extra):
+        missing = self.size + extra - self._healthy - self._pending
+        if missing <= 0 or self._closed:
+            return
+        self._pending += missing
+        if self._fetcher is None or not self._fetcher.is_alive():
+            self._fetcher = Thread(target=self._fetch_tokens, daemon=True)
+            self._fetcher.start()
+
+    def _fetch_tokens(self):
+        errors = 0
+        while True:
+            with self._condition:
+                if self._pending <= 0 or self._closed:
+                    self._pending = 0
+                    self._fetcher = None
+                    return
+
+            try:
+                value = self.fetch_token()
+            except Exception as e:
+                self.fetch_errors += 1
+                errors += 1
+                with self._condition:
+                    self._fetch_error = e
+                    self._condition.notify_all()
+                time.sleep(min(2**errors, 60))
+                continue
+            errors = 0
+
+            with self._condition:
+                self._fetch_error = None
+                self._pending -= 1
+                self._tokens.append(GuestToken(value, self.ttl, self.budget))
+                self._healthy += 1
+                self.fetched += 1
+                self._condition.notify_all()
+            self._save()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from urllib3 import ProxyManager, PoolManager, Timeout
+from urllib3.util import Retry, parse_url
+from .decoding import get_default_decoder
+from .http_cache import normalize_url
+from threading import Lock
+from os import environ
+import time
+
+try:
+    from urllib3.util.request import ACCEPT_ENCODING
+except ImportError:
+    ACCEPT_ENCODING = 'gzip,deflate'
+
+
+class Response:
+    __slots__ = ('status', 'headers', 'data')
+
+    def __init__(self, status, headers, data):
+        self.status = status
+        self.headers = headers
+        self.data = data
+
+    def json(self, decoder=None):
+        if decoder is None:
+            decoder = get_default_decoder()
+        return decoder.loads(self.data)
+
+    def text(self):
+        return self.data.decode('utf-8')
+
+
+class Transport:
+    """
+    Keep-alive HTTP transport shared by every request of a client. Any object
+    with a compatible `request` method can be plugged in instead. With an
+    HTTPCache, GET requests to the cached endpoint classes are answered from
+    disk while fresh and revalidated with conditional requests afterwards.
+    The connection pools are only created on the first request, and
+    redirects are followed up to `max_redirects` times.
+    """
+
+    def __init__(self,
+                 maxsize=100,
+                 pool_sizes=None,
+                 num_pools=10,
+                 timeout=30,
+                 connect_timeout=10,
+                 proxy=None,
+                 block=True,
+                 cache=None,
+                 max_redirects=5):
+        if proxy is None:
+            proxy = environ.get('HTTPS_PROXY', environ.get('HTTP_PROXY'))
+
+        self.maxsize = maxsize
+        self.pool_sizes = dict(pool_sizes or {})
+        self.timeout = Timeout(connect=connect_timeout, read=timeout)
+        self.cache = cache
+
+        self.proxy = proxy
+        self._options = {
+            'num_pools': num_pools,
+            'maxsize': maxsize,
+            'block': block,
+            'timeout': self.timeout,
+            # Failures are retried by the clients' RetryPolicy, only redirects are followed here
+            'retries': Retry(total=None,
+                             connect=0,
+                             read=0,
+                             status=0,
+                             other=0,
+                             redirect=max_redirects)
+        }
+        # One pool manager per connection pool size, see pool_sizes
+        self._managers = dict()
+        self._lock = Lock()
+
+    def _get_manager(self, url):
+        maxsize = self.pool_sizes.get(parse_url(url).host, self.maxsize)
+        manager = self._managers.get(maxsize)
+        if manager is None:
+            with self._lock:
+                manager = self._managers.get(maxsize)
+                if manager is None:
+                    options = dict(self._options, maxsize=maxsize)
+                    if self.proxy:
+                        manager = ProxyManager(self.proxy, **options)
+                    else:
+                        manager = PoolManager(**options)
+                    self._managers[maxsize] = manager
+        return manager
+
+    def request(self, method, url, headers=None, body=None):
+        if self.cache is not None and method == 'GET':
+            ttl = self.cache.get_ttl(url)
+            if ttl is not None:
+                return self._request_cached(url, headers, ttl)
+        return self._request(method, url, headers, body)
+
+    def get_cached(self, url):
+        # Fresh cached response of a GET request, None when it has to go out
+        if self.cache is None or self.cache.get_ttl(url) is None:
+            return
+        entry = self.cache.get(normalize_url(url))
+        if entry is not None and entry.is_fresh(time.time()):
+            self.cache.hits += 1
+            return Response(entry.status, entry.headers, entry.data)
+
+    def _request_cached(self, url, headers, ttl):
+        key = normalize_url(url)
+        entry = self.cache.get(key)
+        if entry is None:
+            self.cache.misses += 1
+        else:
+            if entry.is_fresh(time.time()):
+                self.cache.hits += 1
+                return Response(entry.status, entry.headers, entry.data)
+            headers = dict(headers or {})
+            headers.update(entry.get_validators())
+
+        response = self._request('GET', url, headers)
+        if response.status == 304 and entry is not None:
+            self.cache.revalidations += 1
+            self.cache.refresh(key, entry, ttl)
+            # The fresh headers carry the rate limits of this request
+            headers = dict(entry.headers)
+            headers.update((name.lower(), value) for name, value in response.headers.items())
+            return Response(entry.status, headers, entry.data)
+        if response.status == 200:
+            self.cache.set(key, response.status, response.headers, response.data, ttl)
+        return response
+
+    def _request(self, method, url, headers=None, body=None):
+        headers = dict(headers or {})
+        # Only advertise the encodings urllib3 is able to decode
+        headers['accept-encoding'] = ACCEPT_ENCODING
+
+        # The manager adds the proxy headers and follows redirects
+        response = self._get_manager(url).urlopen(method,
+                                                  url,
+                                                  body=body,
+                                                  headers=headers,
+                                                  preload_content=True,
+                                                  decode_content=True)
+        return Response(response.status, response.headers, response.data)
+
+    def clear(self):
+        for manager in list(self._managers.values()):
+            manager.clear()
+
+
+_default_transport = None
+_default_transport_lock = Lock()
+
+
+def get_default_transport():
+    global _default_transport
+    if _default_transport is None:
+        with _default_transport_lock:
+            if _default_transport is None:
+                _default_transport = Transport()
+    return _default_transport
+
+
+def __getattr__(name):
+    # default_transport is built on first use instead of at import time
+    if name == 'default_transport':
+        return get_default_transport()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -24,4 +24,11 @@ setup(name='bluebird',
           "Programming Language :: Python :: Implementation :: PyPy",
           "Topic :: Software Development :: Libraries :: Python Modules",
       ],
-      install_requires=['requests', 'orderedset', 'lxml'])
+      install_requires=['urllib3', 'lxml'],
+      extras_require={
+          'async': ['aiohttp'],
+          'aggregation': ['numpy'],
+          'json': ['orjson', 'pysimdjson'],
+          'parquet': ['pyarrow']
+      },
+      entry_points={'console_scripts': ['bluebird=bluebird.cli:main']})
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from urllib.parse import urlsplit, parse_qs
+from threading import Lock
+from bluebird import BlueBird
+from bluebird.transport import Response
+import pytest
+import json
+
+FIRST_TWEET_ID = 1300000000000000000
+
+
+class FakeTransport:
+    # Serves `pages` search pages (API 2) of `tweets_per_page` tweets, the last one without cursor
+    def __init__(self, pages=5, tweets_per_page=10):
+        self.pages = pages
+        self.tweets_per_page = tweets_per_page
+        self.requests = []
+        self.guest_tokens = 0
+        self._lock = Lock()
+
+    def get_tweet_ids(self, page):
+        start = FIRST_TWEET_ID - page * self.tweets_per_page
+        return [str(start - i) for i in range(self.tweets_per_page)]
+
+    def request(self, method, url, headers=None, body=None):
+        with self._lock:
+            self.requests.append(url)
+            if 'guest/activate' in url:
+                self.guest_tokens += 1
+                data = {'guest_token': str(self.guest_tokens)}
+                return Response(200, {}, json.dumps(data).encode('utf-8'))
+
+        page = int(parse_qs(urlsplit(url).query).get('cursor', ['0'])[0])
+        entries = []
+        if page + 1 < self.pages:
+            entries.append({'content': {'operation': {'cursor': {'value': str(page + 1)}}}})
+        data = {
+            'globalObjects': {
+                'tweets': {tweet_id: {'full_text': f'tweet {tweet_id}'}
+                           for tweet_id in self.get_tweet_ids(page)}
+            },
+            'timeline': {'instructions': [{'addEntries': {'entries': entries}}]}
+        }
+        return Response(200, {}, json.dumps(data).encode('utf-8'))
+
+    def get_pages(self):
+        return [parse_qs(urlsplit(url).query).get('cursor', ['0'])[0]
+                for url in self.requests if 'guest/activate' not in url]
+
+
+@pytest.fixture
+def transport():
+    return FakeTransport()
+
+
+@pytest.fixture
+def client(transport):
+    client = BlueBird(transport=transport)
+    yield client
+    client.guest_tokens.close()
+    client.close()
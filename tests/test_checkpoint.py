@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from itertools import islice
+from bluebird import MemoryCheckpointStore, FileCheckpointStore, SQLiteCheckpointStore
+from bluebird.checkpoint import CheckpointStore
+import pytest
+
+QUERY = {'fields': [{'items': ['python']}]}
+
+
+@pytest.fixture(params=['memory', 'file', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        yield MemoryCheckpointStore()
+    elif request.param == 'file':
+        yield FileCheckpointStore(str(tmp_path / 'checkpoints'))
+    else:
+        store = SQLiteCheckpointStore(str(tmp_path / 'checkpoints.db'))
+        yield store
+        store.close()
+
+
+def test_incomplete_store_is_not_instantiable():
+    class IncompleteStore(CheckpointStore):
+        def load(self, key):
+            pass
+
+    with pytest.raises(TypeError):
+        IncompleteStore()
+
+
+@pytest.mark.parametrize('prefetch', [0, 2])
+def test_search_resumes_from_checkpoint(client, transport, store, prefetch):
+    all_ids = {tweet_id for page in range(transport.pages)
+               for tweet_id in transport.get_tweet_ids(page)}
+
+    # Stopped in the middle of the third page
+    tweets = client.search(QUERY, deep=True, count=10, checkpoint=store, prefetch=prefetch)
+    first_ids = [tweet['id'] for tweet in islice(tweets, 25)]
+    tweets.close()
+
+    tweets = client.search(QUERY, deep=True, count=10, checkpoint=store, prefetch=prefetch)
+    resumed_ids = [tweet['id'] for tweet in tweets]
+
+    # The crawl goes on from the last page yielded completely, and nothing is missed
+    assert resumed_ids == [tweet_id for page in range(2, transport.pages)
+                           for tweet_id in transport.get_tweet_ids(page)]
+    assert set(first_ids) | set(resumed_ids) == all_ids
+
+
+def test_finished_search_deletes_checkpoint(client, transport, store):
+    tweets = list(client.search(QUERY, deep=True, count=10, checkpoint=store))
+    assert len(tweets) == transport.pages * transport.tweets_per_page
+
+    # Nothing left to resume, the next search starts over
+    requests = len(transport.get_pages())
+    tweets = list(client.search(QUERY, deep=True, count=10, checkpoint=store))
+    assert len(tweets) == transport.pages * transport.tweets_per_page
+    assert transport.get_pages()[requests] == '0'
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from bluebird import SortedIdSet, BloomFilter
+from bluebird.dedup import IdStore
+import subprocess
+import pytest
+import sys
+import os
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_incomplete_id_store_is_not_instantiable():
+    class IncompleteStore(IdStore):
+        def add(self, value):
+            pass
+
+    with pytest.raises(TypeError):
+        IncompleteStore()
+
+
+@pytest.mark.parametrize('merge_threshold', [1, 100, 65536])
+def test_sorted_id_set(merge_threshold):
+    ids = SortedIdSet(merge_threshold=merge_threshold)
+    assert ids.add(3)
+    assert ids.add('2')
+    assert not ids.add(3)
+    assert not ids.add('2')
+    for value in range(1000, 0, -7):
+        ids.add(value)
+    ids.flush()
+    assert 3 in ids
+    assert '1000' in ids
+    assert 4 not in ids
+    assert len(ids) == len(set(range(1000, 0, -7)) | {2, 3})
+
+
+def test_filter_yields_each_id_once():
+    items = [{'id': str(value % 10)} for value in range(30)]
+    with SortedIdSet() as ids:
+        assert [item['id'] for item in ids.filter(items)] == [str(value) for value in range(10)]
+
+
+def test_sorted_id_set_is_persisted(tmp_path):
+    path = str(tmp_path / 'ids')
+    with SortedIdSet(path, merge_threshold=100) as ids:
+        for value in range(250):
+            ids.add(value)
+    assert not os.path.exists(f'{path}.journal')
+
+    with SortedIdSet(path, merge_threshold=100) as ids:
+        assert len(ids) == 250
+        assert 249 in ids
+        assert not ids.add(0)
+        assert ids.add(250)
+
+
+def test_sorted_id_set_recovers_journal_after_crash(tmp_path):
+    path = str(tmp_path / 'ids')
+    # Killed without closing: 2 merges, 2 full journal writes and 10 IDs never written
+    code = f'''
+import os
+from bluebird import SortedIdSet
+ids = SortedIdSet({path!r}, merge_threshold=100, journal_size=20)
+for value in range(250):
+    ids.add(value)
+os._exit(0)
+'''
+    subprocess.run([sys.executable, '-c', code], cwd=REPOSITORY, check=True)
+
+    with SortedIdSet(path, merge_threshold=100, journal_size=20) as ids:
+        assert len(ids) == 240
+        assert 239 in ids
+        assert 240 not in ids
+
+
+def test_bloom_filter(tmp_path):
+    path = str(tmp_path / 'bloom')
+    with BloomFilter(capacity=10000, error_rate=0.01, path=path) as ids:
+        assert ids.add(1)
+        assert not ids.add('1')
+        for value in range(2, 5000):
+            ids.add(value)
+
+    with BloomFilter(path=path) as ids:
+        # No false negatives, and about error_rate false positives
+        assert all(value in ids for value in range(1, 5000))
+        false_positives = sum(value in ids for value in range(10**6, 10**6 + 10000))
+        assert false_positives < 200
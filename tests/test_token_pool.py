@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from itertools import count
+from bluebird import GuestTokenPool, GuestTokenCache
+import pytest
+import time
+
+
+class TokenFactory:
+    def __init__(self, error=None):
+        self.error = error
+        self.values = count(1)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return str(next(self.values))
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def factory():
+    return TokenFactory()
+
+
+def test_cold_pool_fetches_on_first_acquire(factory):
+    pool = GuestTokenPool(factory, size=1, prewarm=False)
+    assert factory.calls == 0
+    assert pool.acquire(timeout=5).value == '1'
+    assert pool.acquire(timeout=5).value == '1'
+    assert factory.calls == 1
+    pool.close()
+
+
+def test_cold_pool_fills_up_to_size(factory):
+    pool = GuestTokenPool(factory, size=3, prewarm=False)
+    pool.acquire(timeout=5)
+    wait_for(lambda: len(pool) == 3)
+    values = {pool.acquire(timeout=5).value for _ in range(6)}
+    assert values == {'1', '2', '3'}
+    assert factory.calls == 3
+    pool.close()
+
+
+def test_prewarm(factory):
+    pool = GuestTokenPool(factory, size=2)
+    wait_for(lambda: len(pool) == 2)
+    assert factory.calls == 2
+    pool.close()
+
+
+def test_retired_token_is_replaced(factory):
+    pool = GuestTokenPool(factory, size=1, prewarm=False)
+    token = pool.acquire(timeout=5)
+    pool.retire(token)
+    assert pool.acquire(timeout=5).value == '2'
+    assert pool.retired == 1
+    pool.close()
+
+
+def test_expired_token_is_replaced(factory):
+    pool = GuestTokenPool(factory, size=1, ttl=0.2, prewarm=False)
+    assert pool.acquire(timeout=5).value == '1'
+    time.sleep(0.3)
+    assert pool.acquire(timeout=5).value != '1'
+    pool.close()
+
+
+def test_spent_token_is_replaced(factory):
+    pool = GuestTokenPool(factory, size=1, budget=2, refresh_threshold=0, prewarm=False)
+    assert pool.acquire(timeout=5).value == '1'
+    assert pool.acquire(timeout=5).value == '1'
+    assert pool.acquire(timeout=5).value == '2'
+    pool.close()
+
+
+def test_acquire_raises_fetch_error():
+    factory = TokenFactory(error=ConnectionError('unreachable'))
+    pool = GuestTokenPool(factory, size=1, prewarm=False)
+    with pytest.raises(ConnectionError):
+        pool.acquire(timeout=5)
+    assert pool.fetch_errors >= 1
+    pool.close()
+
+
+def test_acquire_times_out():
+    pool = GuestTokenPool(lambda: time.sleep(1) or '1', size=1, prewarm=False)
+    assert pool.acquire(timeout=0.05) is None
+    assert pool.acquire(block=False) is None
+    pool.close()
+
+
+def test_cached_tokens_are_reused(factory, tmp_path):
+    cache = GuestTokenCache(str(tmp_path / 'tokens.json'))
+    pool = GuestTokenPool(factory, size=2, cache=cache)
+    wait_for(lambda: len(pool) == 2)
+    pool.close()
+
+    pool = GuestTokenPool(factory, size=2, cache=cache)
+    assert {pool.acquire(timeout=5).value for _ in range(2)} == {'1', '2'}
+    assert factory.calls == 2
+    pool.close()